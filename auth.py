@@ -0,0 +1,50 @@
+import hmac # Constant-time comparison of passwords stored by older versions
+import os # Number of CPU cores
+from concurrent.futures import ThreadPoolExecutor # Pool of threads that run the password hashing
+from werkzeug.security import generate_password_hash, check_password_hash # Import password hashing utilities from werkzeug
+
+DEFAULT_ITERATIONS = 600000 # PBKDF2-SHA256 work factor, raise it as hardware gets faster
+
+
+# Check whether a stored password is a werkzeug hash ('method$salt$hash'), older versions stored some passwords as plain text
+def is_password_hash(stored):
+    return stored.count('$') == 2 and stored.split('$', 1)[0].split(':', 1)[0] in ('pbkdf2', 'scrypt')
+
+
+# Class for hashing and checking passwords on a pool of worker threads
+# PBKDF2 runs inside OpenSSL without holding Python's GIL, so the threads use every core while the caller's thread stays free
+class PasswordHasher:
+
+    def __init__(self, iterations=DEFAULT_ITERATIONS, workers=None):
+        self.iterations = iterations # Work factor of new hashes
+        self.method = 'pbkdf2:sha256:%d' % iterations # werkzeug method string of new hashes
+        self.workers = workers or os.cpu_count() or 1 # At most this many passwords are hashed at once
+        self.pool = None # Started on first use
+
+    '''Running the hashing'''
+    # Run fn(*args) on the pool and return a Future
+    def submit(self, fn, *args):
+        if self.pool is None:
+            self.pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='password')
+        return self.pool.submit(fn, *args)
+
+    '''Hashing and checking passwords'''
+    # Hash a password with the configured work factor, the calling thread waits without using a core
+    def hash(self, password):
+        return self.submit(generate_password_hash, password, self.method).result()
+
+    # Check a password against its stored hash, or against a plain text password stored by an older version
+    def verify(self, stored, password):
+        if not is_password_hash(stored):
+            return hmac.compare_digest(stored.encode(), password.encode())
+        return self.submit(check_password_hash, stored, password).result()
+
+    # Whether a stored password should be hashed again with the configured method, after a successful login
+    def needs_rehash(self, stored):
+        return not stored.startswith(self.method + '$')
+
+    '''Closing the pool'''
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
@@ -0,0 +1,69 @@
+'''Benchmark for streaming export and import: round-trips a large number of tasks and reports throughput and peak memory
+
+Run from the project folder:
+    python benchmarks/bench_export_import.py                     # 1,000,000 tasks, JSON Lines and CSV
+    python benchmarks/bench_export_import.py --tasks 200000 --format csv
+    python benchmarks/bench_export_import.py --fetchall          # finish with get_tasks, to compare its memory use
+
+Tasks of user 1 are exported to a file, imported as user 2's tasks, and the two are compared.
+Peak RSS only ever grows, so the value after each step is the highest reached up to then.
+'''
+import argparse # Command line options
+import os # Paths
+import resource # Peak memory use
+import sys # Import path
+import tempfile # Throwaway database folder
+import time # Timing
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__)))) # Make database.py importable
+from database import EXPORT_FORMATS, Database # The database class being benchmarked
+
+
+def peak_rss(): # Highest resident memory of this process so far, in MB
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 / (1024 if sys.platform == 'darwin' else 1) # Bytes on macOS, KB elsewhere
+
+
+def tasks_of(db, user_id): # Iterate over the (task, due date, completed) rows of a user, in order
+    return db.con.execute("SELECT task, due_date, completed FROM tasks WHERE user_id = ? ORDER BY id", (user_id,))
+
+
+def step(name, count, run): # Time run(), then report its throughput and the peak memory so far
+    start = time.perf_counter()
+    result = run()
+    elapsed = time.perf_counter() - start
+    print('  %-24s %9d tasks in %6.2fs  %9.0f tasks/sec  peak RSS %6.1f MB' % (name, count, elapsed, count / elapsed, peak_rss()))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--tasks', type=int, default=1_000_000) # Number of tasks round-tripped
+    parser.add_argument('--format', choices=EXPORT_FORMATS, nargs='+', default=list(EXPORT_FORMATS))
+    parser.add_argument('--fetchall', action='store_true') # Also load every task with get_tasks at the end
+    args = parser.parse_args()
+
+    folder = tempfile.mkdtemp()
+    db = Database(os.path.join(folder, 'bench.db'))
+    print('peak RSS after opening the database: %.1f MB' % peak_rss())
+    step('seed (create_tasks)', args.tasks, lambda: db.create_tasks(1, (('Task %d' % i, '2026-%02d-%02d' % (i % 12 + 1, i % 28 + 1)) for i in range(args.tasks))))
+
+    for user_id, format in enumerate(args.format, 2): # Every format imports into a new user
+        path = os.path.join(folder, 'tasks.' + format)
+        print(format)
+        with open(path, 'w', newline='', encoding='utf-8') as stream: # The csv module does its own line endings
+            step('export', args.tasks, lambda: db.export_tasks(1, stream, format))
+        print('  %-24s %9.1f MB' % ('file size', os.path.getsize(path) / 1e6))
+        with open(path, newline='', encoding='utf-8') as stream:
+            imported = step('import', args.tasks, lambda: db.import_tasks(user_id, stream, format))
+        same = sum(a == b for a, b in zip(tasks_of(db, 1), tasks_of(db, user_id))) # Compared in order, without loading them
+        print('  %-24s %9d of %d tasks identical' % ('round trip', same, imported))
+        os.remove(path)
+
+    if args.fetchall:
+        step('get_tasks (fetchall)', args.tasks, lambda: db.get_tasks(1))
+    db.close_db_connection()
+
+
+if __name__ == '__main__':
+    main()
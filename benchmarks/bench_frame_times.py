@@ -0,0 +1,85 @@
+'''Benchmark for UI frame times while the database is busy
+
+Runs a bulk insert of --tasks tasks and then a get_tasks of all of them, and records the time between frames meanwhile.
+    python benchmarks/bench_frame_times.py           # database on the DatabaseExecutor worker thread
+    python benchmarks/bench_frame_times.py --sync    # database called on the UI thread, as the app used to
+
+A frame time under 16 ms means the UI kept drawing at 60 frames per second.
+'''
+import argparse # Command line options
+import os # Paths
+import sys # Import path
+import tempfile # Throwaway database folder
+import time # Timing
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__))) # Project folder
+sys.path.insert(0, ROOT)
+os.environ.setdefault('KIVY_NO_ARGS', '1') # Keep Kivy from parsing our command line
+
+from kivy.app import App
+from kivy.clock import Clock
+from kivy.uix.label import Label
+
+from database import Database
+from db_executor import DatabaseExecutor
+
+
+class FrameTimesApp(App):
+    def __init__(self, args, **kwargs):
+        super().__init__(**kwargs)
+        self.args = args
+        self.path = os.path.join(tempfile.mkdtemp(), 'bench.db')
+        self.frames = [] # Time between consecutive frames, in ms
+        self.last = None # perf_counter() of the previous frame
+        self.started = None # When the database work started
+
+    def build(self):
+        return Label(text='Database busy...')
+
+    def on_start(self):
+        Clock.schedule_interval(self.frame, 0) # Called once every frame
+        Clock.schedule_once(self.start_work, 0.5) # Let the window settle first
+
+    def frame(self, dt):
+        now = time.perf_counter()
+        if self.last is not None and self.started is not None:
+            self.frames.append((now - self.last) * 1000)
+        self.last = now
+
+    def start_work(self, dt):
+        tasks = ('Task %d' % i for i in range(self.args.tasks))
+        self.started = time.perf_counter()
+        if self.args.sync: # Everything on the UI thread
+            db = Database(self.path)
+            db.create_tasks(1, tasks)
+            db.get_tasks(1)
+            db.close_db_connection()
+            self.finish()
+        else: # Everything on the database thread, the UI only gets the callback
+            self.executor = DatabaseExecutor(schedule=lambda fn: Clock.schedule_once(lambda dt: fn()), path=self.path)
+            self.executor.submit('create_tasks', 1, tasks)
+            self.executor.submit('get_tasks', 1, callback=lambda result: self.finish())
+
+    def finish(self):
+        Clock.schedule_once(self.report, 0.2) # Keep recording a few frames after the work is done
+
+    def report(self, dt):
+        busy = time.perf_counter() - self.started
+        frames = sorted(self.frames)
+        if not frames:
+            frames = [busy * 1000]
+        p99 = frames[max(int(len(frames) * 0.99) - 1, 0)]
+        slow = sum(1 for frame in frames if frame > 16.7)
+        print('%s: %d tasks, busy %.2fs, %d frames, median %.1f ms, p99 %.1f ms, max %.1f ms, %d frames over 16.7 ms'
+              % ('sync' if self.args.sync else 'executor', self.args.tasks, busy, len(frames),
+                 frames[len(frames) // 2], p99, frames[-1], slow))
+        if not self.args.sync:
+            self.executor.close()
+        self.stop()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--tasks', type=int, default=500_000) # Size of the bulk insert and of the get_tasks result
+    parser.add_argument('--sync', action='store_true') # Run the database on the UI thread instead
+    FrameTimesApp(parser.parse_args()).run()
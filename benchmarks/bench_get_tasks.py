@@ -0,0 +1,90 @@
+'''Benchmark for task retrieval on a large database: full scans vs the (user_id, completed, id) index
+
+Run from the project folder:
+    python benchmarks/bench_get_tasks.py                       # seeds bench_todo.db with 2,000,000 tasks
+    python benchmarks/bench_get_tasks.py --tasks 5000000 --users 2000
+
+The seeded database is kept so later runs skip the seeding, delete it to reseed.
+'''
+import argparse # Command line options
+import os # Paths
+import random # Random task owners and statuses
+import statistics # Median and percentiles
+import sys # Import path
+import time # Timing
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__)))) # Make database.py importable
+from database import Database # The database class being benchmarked
+
+
+def seed(db, tasks, users): # Fill the tasks table with `tasks` rows spread over `users` users
+    have = db.cursor.execute("SELECT COUNT(*) FROM tasks").fetchone()[0]
+    if have >= tasks:
+        return
+    rng = random.Random(42)
+    rows = ((rng.randrange(1, users + 1), 'Task %d' % i, 'Monday 01 January 2024', int(rng.random() < 0.7)) for i in range(have, tasks))
+    start = time.perf_counter()
+    db.cursor.executemany("INSERT INTO tasks(user_id, task, due_date, completed) VALUES(?, ?, ?, ?)", rows) # One transaction for every row
+    db.con.commit()
+    print('seeded %d tasks in %.1fs' % (tasks - have, time.perf_counter() - start))
+
+
+def old_get_tasks(db, user_id): # get_tasks as it was before: two separate queries
+    complete = db.cursor.execute("SELECT id, task, due_date FROM tasks WHERE completed = 1 AND user_id = ?", (user_id,)).fetchall()
+    incomplete = db.cursor.execute("SELECT id, task, due_date FROM tasks WHERE completed = 0 AND user_id = ?", (user_id,)).fetchall()
+    return incomplete, complete
+
+
+def measure(label, fn, user_ids): # Time `fn(user_id)` for every user and print the latency distribution
+    times = []
+    for user_id in user_ids:
+        start = time.perf_counter()
+        fn(user_id)
+        times.append((time.perf_counter() - start) * 1000)
+    times.sort()
+    p95 = times[int(len(times) * 0.95) - 1]
+    print('%-34s median %9.3f ms   p95 %9.3f ms   max %9.3f ms' % (label, statistics.median(times), p95, times[-1]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--db', default='bench_todo.db') # Database file to seed and query
+    parser.add_argument('--tasks', type=int, default=2_000_000) # Number of tasks to seed
+    parser.add_argument('--users', type=int, default=1000) # Number of users owning them
+    parser.add_argument('--queries', type=int, default=50) # Number of users queried per measurement
+    args = parser.parse_args()
+
+    db = Database(args.db)
+    seed(db, args.tasks, args.users)
+    user_ids = random.Random(7).sample(range(1, args.users + 1), min(args.queries, args.users))
+
+    print('\nbefore: no index')
+    indexes = db.cursor.execute("SELECT name, sql FROM sqlite_master WHERE type = 'index' AND tbl_name = 'tasks' AND sql IS NOT NULL").fetchall()
+    for name, sql in indexes: # Every index on tasks, later ones like (user_id, completed, due_date) serve these queries too
+        db.cursor.execute("DROP INDEX %s" % name)
+    db.con.commit()
+    measure('old get_tasks (two scans)', lambda user_id: old_get_tasks(db, user_id), user_ids)
+
+    print('\nafter: (user_id, completed, id) index')
+    for name, sql in indexes: # Put every index back
+        db.cursor.execute(sql)
+    db.con.commit()
+    measure('old get_tasks (two queries)', lambda user_id: old_get_tasks(db, user_id), user_ids)
+    measure('get_tasks (one query)', lambda user_id: db.get_tasks(user_id), user_ids)
+    measure('get_tasks_page first page', lambda user_id: db.get_tasks_page(user_id, 0, 0, 50), user_ids)
+
+    def last_page(user_id): # Page through every incomplete task, report the time for the final page only
+        after_id, page = 0, db.get_tasks_page(user_id, 0, 0, 50)
+        while len(page) == 50:
+            after_id = page[-1][0]
+            page = db.get_tasks_page(user_id, 0, after_id, 50)
+        start = time.perf_counter()
+        db.get_tasks_page(user_id, 0, after_id, 50)
+        return time.perf_counter() - start
+    deep = sorted(last_page(user_id) * 1000 for user_id in user_ids)
+    print('%-34s median %9.3f ms' % ('get_tasks_page last page', statistics.median(deep)))
+    db.close_db_connection()
+
+
+if __name__ == '__main__':
+    main()
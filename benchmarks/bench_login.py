@@ -0,0 +1,105 @@
+'''Benchmark for password hashing: logins per second against worker threads, and UI frame stalls during a login
+
+Run from the project folder:
+    python benchmarks/bench_login.py
+    python benchmarks/bench_login.py --iterations 300000 --clients 16
+
+The frame stall part ticks a 60 fps "UI loop" on the main thread while logins run, either inline on that thread
+(as LoginScreen used to) or through the DatabaseExecutor, and reports the longest gap between frames.
+'''
+import argparse # Command line options
+import os # Paths and CPU count
+import sys # Import path
+import tempfile # Throwaway database folder
+import threading # Simulated concurrent clients
+import time # Timing
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__)))) # Make the project importable
+from auth import PasswordHasher # The hasher being benchmarked
+from database import Database
+from db_executor import DatabaseExecutor
+
+FRAME = 1 / 60 # Frame time of a 60 fps UI
+
+
+def logins_per_second(stored, workers, clients, logins, iterations): # Verify `logins` passwords from `clients` threads at once
+    hasher = PasswordHasher(iterations=iterations, workers=workers)
+    per_client = logins // clients
+
+    def client():
+        for _ in range(per_client):
+            hasher.verify(stored, 'correct horse')
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    hasher.close()
+    return per_client * clients / elapsed
+
+
+def frame_stalls(path, iterations, inline, logins): # Longest gap between 60 fps frames while `logins` logins run
+    gaps, done = [], threading.Event()
+    if inline: # Old behaviour: the login runs on the UI thread between two frames
+        db = Database(path, hasher=PasswordHasher(iterations=iterations, workers=1))
+        pending = logins
+    else:
+        executor = DatabaseExecutor(path=path, hasher=PasswordHasher(iterations=iterations))
+        remaining = [logins]
+
+        def finished(user):
+            remaining[0] -= 1
+            if remaining[0]:
+                executor.submit('authenticate_user', 'bench', 'correct horse', callback=finished)
+            else:
+                done.set()
+        executor.submit('authenticate_user', 'bench', 'correct horse', callback=finished)
+    last = time.perf_counter()
+    while not done.is_set():
+        if inline:
+            db.authenticate_user('bench', 'correct horse')
+            pending -= 1
+            if not pending:
+                done.set()
+        time.sleep(FRAME) # Draw a frame
+        now = time.perf_counter()
+        gaps.append((now - last) * 1000)
+        last = now
+    if inline:
+        db.close_db_connection()
+    else:
+        executor.close()
+    return max(gaps), sum(1 for gap in gaps if gap > FRAME * 1000 * 1.5)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=600000) # PBKDF2 work factor
+    parser.add_argument('--clients', type=int, default=8) # Logins running at once
+    parser.add_argument('--logins', type=int, default=32) # Logins per measurement
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), 'bench.db')
+    db = Database(path, hasher=PasswordHasher(iterations=args.iterations))
+    db.create_user('bench', 'correct horse')
+    stored = db.cursor.execute("SELECT password FROM users WHERE username = 'bench'").fetchone()[0]
+    db.close_db_connection()
+
+    print('logins/sec with %d concurrent clients, %d PBKDF2 iterations' % (args.clients, args.iterations))
+    workers = 1
+    while True:
+        print('  %2d workers: %7.1f logins/sec' % (workers, logins_per_second(stored, workers, args.clients, args.logins, args.iterations)))
+        if workers >= (os.cpu_count() or 1):
+            break
+        workers = min(workers * 2, os.cpu_count() or 1)
+
+    print('\nUI frame stalls during %d logins' % (args.logins // 4))
+    for inline in (True, False):
+        longest, stalled = frame_stalls(path, args.iterations, inline, args.logins // 4)
+        print('  %-18s longest frame %7.1f ms, %d stalled frames' % ('on the UI thread' if inline else 'DatabaseExecutor', longest, stalled))
+
+
+if __name__ == '__main__':
+    main()
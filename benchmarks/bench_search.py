@@ -0,0 +1,85 @@
+'''Benchmark for full-text task search on a large database
+
+Run from the project folder:
+    python benchmarks/bench_search.py                      # seeds bench_search.db with 1,000,000 tasks
+    python benchmarks/bench_search.py --tasks 5000000 --users 500 --heavy-tasks 500000
+
+Besides the --users users sharing --tasks tasks, one heavy user owns --heavy-tasks tasks and is measured separately.
+Queries are replayed the way search-as-you-type sends them: every prefix of a phrase, one keystroke at a time.
+The seeded database is kept so later runs skip the seeding, delete it to reseed.
+'''
+import argparse # Command line options
+import os # Paths
+import random # Random task texts and queries
+import sys # Import path
+import time # Timing
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__)))) # Make database.py importable
+from database import Database # The database class being benchmarked
+
+WORDS = ('buy groceries milk bread eggs call mum dad dentist doctor book flight hotel pay rent bills water plants '
+         'clean kitchen bathroom garage email boss report meeting prepare slides review code fix bike car service '
+         'renew passport insurance tax return gym run swim walk dog vet birthday present party order pizza read '
+         'chapter finish homework study exam revise notes laundry iron shirts cook dinner lunch plan holiday').split()
+
+
+def seed(db, tasks, users): # Fill the tasks table with `tasks` random task descriptions spread over `users` users
+    have = db.cursor.execute("SELECT COUNT(*) FROM tasks WHERE user_id <= ?", (users,)).fetchone()[0] # Not the heavy user's
+    if have >= tasks:
+        return
+    rng = random.Random(42)
+    start = time.perf_counter()
+    for user_id in range(1, users + 1): # create_tasks is one transaction per call
+        count = (tasks - have) // users + (1 if user_id <= (tasks - have) % users else 0)
+        db.create_tasks(user_id, (' '.join(rng.sample(WORDS, rng.randint(2, 5))) for _ in range(count)))
+    print('seeded %d tasks in %.1fs' % (tasks - have, time.perf_counter() - start))
+
+
+def seed_heavy_user(db, user_id, tasks): # Give one user `tasks` tasks, like a power user
+    have = db.cursor.execute("SELECT COUNT(*) FROM tasks WHERE user_id = ?", (user_id,)).fetchone()[0]
+    if have >= tasks:
+        return
+    rng = random.Random(43)
+    start = time.perf_counter()
+    db.create_tasks(user_id, (' '.join(rng.sample(WORDS, rng.randint(2, 5))) for _ in range(tasks - have)))
+    print('seeded %d tasks for the heavy user in %.1fs' % (tasks - have, time.perf_counter() - start))
+
+
+def measure(db, name, user_ids, phrases): # Type `phrases` phrases one keystroke at a time, each for a user from `user_ids`
+    rng = random.Random(7)
+    times = []
+    for _ in range(phrases):
+        user_id = rng.choice(user_ids)
+        phrase = ' '.join(rng.sample(WORDS, rng.randint(1, 2)))
+        for end in range(1, len(phrase) + 1): # Every keystroke
+            start = time.perf_counter()
+            db.search_tasks(user_id, phrase[:end])
+            times.append((time.perf_counter() - start) * 1000)
+    times.sort()
+    percentile = lambda p: times[max(int(len(times) * p) - 1, 0)]
+    print('%-10s %d queries: p50 %.2f ms, p95 %.2f ms, p99 %.2f ms, max %.2f ms'
+          % (name, len(times), percentile(0.50), percentile(0.95), percentile(0.99), times[-1]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--db', default='bench_search.db') # Database file to seed and query
+    parser.add_argument('--tasks', type=int, default=1_000_000) # Number of tasks to seed
+    parser.add_argument('--users', type=int, default=100) # Number of users owning them
+    parser.add_argument('--heavy-tasks', type=int, default=200_000) # Number of tasks of the heavy user
+    parser.add_argument('--phrases', type=int, default=200) # Number of phrases typed
+    args = parser.parse_args()
+
+    db = Database(args.db)
+    seed(db, args.tasks, args.users)
+
+    heavy_user = args.users + 1
+    seed_heavy_user(db, heavy_user, args.heavy_tasks)
+
+    measure(db, 'users', list(range(1, args.users + 1)), args.phrases)
+    measure(db, 'heavy user', [heavy_user], args.phrases)
+    db.close_db_connection()
+
+
+if __name__ == '__main__':
+    main()
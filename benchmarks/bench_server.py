@@ -0,0 +1,118 @@
+'''Load test for server.py: requests per second and latency with 1 to 64 users at once
+
+Run from the project folder:
+    python benchmarks/bench_server.py
+    python benchmarks/bench_server.py --users 1 8 32 --duration 10 --pool-size 16
+
+Starts the server on a throwaway database, then every simulated user registers, logs in and keeps sending a mix of
+create, get, mark and delete requests over one keep-alive connection for --duration seconds.
+Passwords use a cheap work factor (--iterations) so the numbers measure the database and the server, not PBKDF2.
+'''
+import argparse # Command line options
+import http.client # Keep-alive HTTP connections
+import json # Request and response bodies
+import os # Paths
+import random # Request mix
+import socket # Free port
+import subprocess # The server runs in its own process, like in production
+import sys # Python executable
+import tempfile # Throwaway database folder
+import threading # Simulated users
+import time # Timing
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__))) # Project folder
+
+
+class User(threading.Thread):
+
+    def __init__(self, port, name, deadline, seed):
+        super().__init__(daemon=True)
+        self.http = http.client.HTTPConnection('127.0.0.1', port)
+        self.name, self.deadline, self.rng = name, deadline, random.Random(seed)
+        self.headers = {'Content-Type': 'application/json'}
+        self.latencies = [] # Of every request after login, in ms
+        self.errors = 0
+
+    def request(self, method, path, body=None):
+        start = time.perf_counter()
+        self.http.request(method, path, json.dumps(body).encode() if body is not None else None, self.headers)
+        response = self.http.getresponse()
+        result = json.loads(response.read())
+        self.latencies.append((time.perf_counter() - start) * 1000)
+        if response.status >= 400:
+            self.errors += 1
+        return result
+
+    def run(self):
+        self.request('POST', '/register', {'username': self.name, 'password': 'secret'})
+        token = self.request('POST', '/login', {'username': self.name, 'password': 'secret'})['token']
+        self.headers['Authorization'] = 'Bearer ' + token
+        self.latencies = []
+        tasks = [] # IDs of this user's tasks
+        while time.perf_counter() < self.deadline:
+            roll = self.rng.random()
+            if roll < 0.3 or not tasks: # Create
+                tasks.append(self.request('POST', '/tasks', {'task': 'Task %d' % len(tasks), 'due_date': '2026-10-18'})['id'])
+            elif roll < 0.7: # Get a page of the list
+                self.request('GET', '/tasks?completed=0&limit=50')
+            elif roll < 0.9: # Mark
+                self.request('POST', '/tasks/%d/%s' % (self.rng.choice(tasks), self.rng.choice(('complete', 'incomplete'))))
+            else: # Delete
+                self.request('DELETE', '/tasks/%d' % tasks.pop(self.rng.randrange(len(tasks))))
+        self.http.close()
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_for(port, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.2).close()
+            return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError('The server did not start within %d seconds' % timeout)
+
+
+def run_level(port, users, duration, level):
+    deadline = time.perf_counter() + duration
+    threads = [User(port, 'user%d_%d' % (level, i), deadline, i) for i in range(users)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    latencies = sorted(latency for thread in threads for latency in thread.latencies)
+    percentile = lambda p: latencies[max(int(len(latencies) * p) - 1, 0)]
+    print('%3d users: %7.0f req/s, p50 %6.2f ms, p99 %7.2f ms, %d errors'
+          % (users, len(latencies) / duration, percentile(0.50), percentile(0.99), sum(thread.errors for thread in threads)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, nargs='+', default=[1, 2, 4, 8, 16, 32, 64]) # Concurrency levels
+    parser.add_argument('--duration', type=float, default=5) # Seconds per level
+    parser.add_argument('--pool-size', type=int, default=8) # Server connection pool size
+    parser.add_argument('--iterations', type=int, default=1000) # PBKDF2 work factor of the simulated users
+    args = parser.parse_args()
+
+    port = free_port()
+    path = os.path.join(tempfile.mkdtemp(), 'bench.db')
+    server = subprocess.Popen([sys.executable, os.path.join(ROOT, 'server.py'), '--db', path, '--port', str(port), '--quiet',
+                               '--pool-size', str(args.pool_size), '--iterations', str(args.iterations)], stdout=subprocess.DEVNULL)
+    try:
+        wait_for(port)
+        print('pool size %d, %.0fs per level' % (args.pool_size, args.duration))
+        for level, users in enumerate(args.users):
+            run_level(port, users, args.duration, level)
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == '__main__':
+    main()
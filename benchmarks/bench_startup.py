@@ -0,0 +1,82 @@
+'''Benchmark for cold start: time from launching the app to the first drawn frame of the login screen
+
+Run from the project folder:
+    python benchmarks/bench_startup.py               # 5 launches, each in a fresh Python process
+    python benchmarks/bench_startup.py --runs 10
+    python benchmarks/bench_startup.py --eager       # also build every screen before the first frame, as the app used to
+
+Every launch reports how long importing main.py took, when the database thread had the schema ready, and when the
+login screen was first drawn, all measured from the start of the process.
+'''
+import argparse # Command line options
+import json # Results of the child processes
+import os # Paths
+import statistics # Medians
+import subprocess # Every launch is a fresh process, so nothing is imported or cached yet
+import sys # Python executable
+import tempfile # Throwaway database folder
+import time # Timing
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__))) # Project folder
+
+
+def launch(eager): # Runs in the child process: start the app, report the timings after the first frame, and quit
+    start = time.perf_counter()
+    os.environ.setdefault('KIVY_NO_ARGS', '1') # Keep Kivy from parsing our command line
+    sys.path.insert(0, ROOT)
+    import main # The app being measured, starts the database thread
+    timings = {'import': time.perf_counter() - start}
+    main.db.submit(lambda db: None, callback=lambda result: timings.setdefault('database', time.perf_counter() - start))
+
+    from kivy.clock import Clock
+    from kivy.core.window import Window
+
+    class StartupApp(main.MainApp):
+        kv_file = os.path.join(ROOT, 'main.kv') # The file of MainApp, not startup.kv
+
+        def on_start(self):
+            super().on_start()
+            if eager:
+                for name in self.screen_classes:
+                    self.get_screen(name)
+            Window.bind(on_flip=self.first_frame)
+
+        def first_frame(self, window):
+            Window.unbind(on_flip=self.first_frame)
+            timings['login_screen'] = time.perf_counter() - start
+            Clock.schedule_once(lambda dt: self.stop(), 0.2) # Let the database callback arrive
+
+        def on_stop(self):
+            super().on_stop()
+            print(json.dumps(timings), flush=True)
+
+    StartupApp().run()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5) # Number of launches
+    parser.add_argument('--eager', action='store_true') # Build every screen at startup
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS) # Set on the launched processes
+    args = parser.parse_args()
+    if args.child:
+        launch(args.eager)
+        return
+
+    folder = tempfile.mkdtemp() # main.py opens todo.db in the working folder, the first launch creates it
+    runs = []
+    for run in range(args.runs):
+        command = [sys.executable, os.path.abspath(__file__), '--child'] + (['--eager'] if args.eager else [])
+        output = subprocess.run(command, cwd=folder, capture_output=True, text=True, check=True).stdout
+        runs.append(json.loads(output.strip().splitlines()[-1]))
+        print('launch %d: import %.0f ms, database ready %.0f ms, login screen %.0f ms%s'
+              % (run + 1, runs[-1]['import'] * 1000, runs[-1].get('database', float('nan')) * 1000,
+                 runs[-1]['login_screen'] * 1000, ' (new database)' if run == 0 else ''))
+    later = runs[1:] or runs # The first launch also creates the database
+    print('median of %d launches: import %.0f ms, time to login screen %.0f ms'
+          % (len(later), statistics.median(run['import'] for run in later) * 1000,
+             statistics.median(run['login_screen'] for run in later) * 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+'''Benchmark for the task list: first-paint time and memory at 1k, 10k and 100k tasks
+
+Run from the project folder:
+    python benchmarks/bench_task_list.py
+    python benchmarks/bench_task_list.py --mode widgets   # one widget per task, like the old MDList container
+
+Each size runs in its own process so the reported peak RSS belongs to that size only.
+'''
+import argparse # Command line options
+import os # Paths and working directory
+import resource # Peak memory (RSS) of the process
+import subprocess # Run every size in a fresh process
+import sys # Python executable and import path
+import tempfile # Throwaway folder for the todo.db created on import
+import time # Timing
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__))) # Project folder containing main.py and main.kv
+SIZES = (1_000, 10_000, 100_000) # Number of tasks to benchmark
+
+
+def run_one(count, mode): # Build the app with `count` tasks and report the time until the first frame is drawn
+    os.environ.setdefault('KIVY_NO_ARGS', '1') # Keep Kivy from parsing our command line
+    sys.path.insert(0, ROOT)
+    os.chdir(tempfile.mkdtemp()) # main.py opens todo.db in the working directory
+    os.environ['KIVY_HOME'] = os.getcwd()
+
+    from kivy.clock import Clock
+    from kivy.resources import resource_add_path
+    resource_add_path(ROOT) # So main.kv is found
+    import main
+
+    class BenchApp(main.MainApp):
+        kv_file = os.path.join(ROOT, 'main.kv')
+
+        def on_start(self):
+            rows = [main.task_row(pk, 'Task %d' % pk, 'Monday 01 January 2024', pk % 3 == 0) for pk in range(count)]
+            self.root.current = 'main'
+            self.started = time.perf_counter() # First paint is measured from the moment the list gets its rows
+            if mode == 'widgets': # Old behaviour: one widget per task inside an MDList
+                from kivymd.uix.list import MDList
+                from kivy.uix.scrollview import ScrollView
+                container = self.task_list
+                scroll = ScrollView(size_hint=container.size_hint, pos_hint=container.pos_hint)
+                items = MDList()
+                for row in rows:
+                    item = main.ListItemWithCheckbox(pk=row['pk'], text=row['text'], secondary_text=row['secondary_text'])
+                    item.ids.check.active = row['completed']
+                    items.add_widget(item)
+                scroll.add_widget(items)
+                container.parent.add_widget(scroll)
+                container.parent.remove_widget(container)
+            else:
+                self.task_list.data = rows
+            Clock.schedule_once(self.painted, 0) # Runs after the next frame has been drawn
+
+        def painted(self, dt):
+            first_paint = time.perf_counter() - self.started
+            rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024 # ru_maxrss is in KiB on Linux
+            print('%s %d %.3f %.1f' % (mode, count, first_paint, rss), flush=True)
+            self.stop()
+
+    BenchApp().run()
+
+
+def main_bench():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--mode', choices=('recycle', 'widgets'), default='recycle') # Virtualised list or one widget per task
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES)
+    parser.add_argument('--child', type=int, help=argparse.SUPPRESS) # Internal: run a single size in this process
+    args = parser.parse_args()
+
+    if args.child is not None:
+        run_one(args.child, args.mode)
+        return
+
+    print('%-8s %8s %14s %10s' % ('mode', 'tasks', 'first paint s', 'RSS MiB'))
+    for count in args.sizes:
+        result = subprocess.run([sys.executable, os.path.abspath(__file__), '--mode', args.mode, '--child', str(count)],
+                                capture_output=True, text=True)
+        lines = [line for line in result.stdout.splitlines() if line.startswith(args.mode + ' ')]
+        if not lines: # The child crashed, show why
+            print(result.stderr, file=sys.stderr)
+            continue
+        mode, tasks, first_paint, rss = lines[-1].split()
+        print('%-8s %8s %14s %10s' % (mode, tasks, first_paint, rss))
+
+
+if __name__ == '__main__':
+    main_bench()
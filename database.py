@@ -1,7 +1,127 @@
+import csv # Exporting and importing tasks as CSV
+import json # Exporting and importing tasks as JSON Lines
+import queue # Idle connections of the pool
+import re # Regular expressions, to recognise ISO dates
 import sqlite3 # Import the sqlite3 library for database operations
-from werkzeug.security import generate_password_hash, check_password_hash # Import password hashing utilities from werkzeug
+import threading # Connections are shared between threads through a pool
+import time # Used to time how long writes have been waiting to be committed
+from contextlib import contextmanager # For Database.session()
+from datetime import date, datetime # Due dates
+from itertools import islice # Batches of imported tasks
+from auth import PasswordHasher # Hashes and checks passwords on worker threads
+from profiling import ProfiledConnection, profiler # Optional timing of every method, statement and commit
+
+DISPLAY_DATE_FORMAT = '%A %d %B %Y' # How due dates are shown, e.g. 'Monday 01 January 2024', and how older versions stored them
+EXPORT_FORMATS = ('jsonl', 'csv') # Formats of export_tasks and import_tasks: JSON Lines, or CSV with a header row
+EXPORT_FIELDS = ('task', 'due_date', 'completed') # Fields of an exported task
+CSV_COMPLETED = {'': 0, '0': 0, 'false': 0, '1': 1, 'true': 1} # Values of the 'completed' column of an imported CSV, in lower case
+SEARCH_CANDIDATES = 1000 # Newest matches of a search that are ranked, see Database.search_tasks
+SCHEMA_VERSION = 2 # Stored in PRAGMA user_version once the schema is set up, raise it when adding a step to Database.migrate()
+ISO_DATE = re.compile(r'[0-9]{4}-[0-9]{2}-[0-9]{2}') # How due dates are stored, e.g. '2024-01-01', so they sort and compare as dates; use fullmatch()
+
+
+# Convert a due date (a date, an ISO date string or a date in DISPLAY_DATE_FORMAT) to the ISO date string stored in the database
+# Text that isn't a date is returned unchanged, an ISO date that doesn't exist (e.g. '2024-02-31') raises ValueError
+def to_iso_date(value):
+    if value is None or isinstance(value, str) and not value:
+        return None
+    if isinstance(value, str) and ISO_DATE.fullmatch(value):
+        date.fromisoformat(value) # Raises ValueError if there is no such day
+        return value
+    if isinstance(value, (date, datetime)):
+        return value.strftime('%Y-%m-%d')
+    try:
+        return datetime.strptime(value, DISPLAY_DATE_FORMAT).strftime('%Y-%m-%d')
+    except ValueError:
+        return value
+
+# Parse exported tasks from a text stream one line at a time, yielding (task, due date, completed) rows for an INSERT
+# Raises ValueError naming the line of the first task that can't be read
+def read_tasks(stream, format='jsonl'):
+    if format == 'jsonl':
+        records = ((number, line) for number, line in enumerate(stream, 1) if line.strip()) # Skip blank lines
+    elif format == 'csv':
+        reader = csv.DictReader(stream)
+        records = ((reader.line_num, record) for record in reader)
+    else:
+        raise ValueError("Unknown format %r, expected one of %s" % (format, ', '.join(EXPORT_FORMATS)))
+    for number, record in records:
+        try:
+            if format == 'jsonl':
+                record = json.loads(record)
+                if not isinstance(record, dict):
+                    raise ValueError("not a JSON object")
+                completed = record.get('completed', False)
+                if not isinstance(completed, int) or completed not in (0, 1): # true/false or 0/1, bool is an int too
+                    raise ValueError("completed must be true, false, 0 or 1")
+            else:
+                completed = CSV_COMPLETED.get((record.get('completed') or '').strip().lower()) # A missing column reads as ''
+                if completed is None:
+                    raise ValueError("completed must be true, false, 0, 1 or empty")
+            task = record.get('task')
+            if not isinstance(task, str) or not task:
+                raise ValueError("no task text")
+            due_date = record.get('due_date')
+            if due_date is not None and not isinstance(due_date, str):
+                raise ValueError("due_date must be text or null")
+            due_date = to_iso_date(due_date) # Raises ValueError for a day that doesn't exist
+        except ValueError as error: # Includes invalid JSON
+            raise ValueError("Line %d: %s" % (number, error)) from None
+        yield task, due_date, int(completed)
+
+
+# A connection from the pool, with its own cursor and its own writes waiting to be committed
+class PooledConnection:
+
+    def __init__(self, con):
+        self.con = con # The SQLite connection
+        self.cursor = con.cursor() # Cursor used by the thread the connection is bound to
+        self.pending_writes = 0 # Number of writes not committed yet
+        self.first_pending = None # When the oldest uncommitted write was made
+
+
+# Class for sharing up to 'size' connections to one database between threads
+# connect() is called to open each connection, at most 'size' are ever opened
+class ConnectionPool:
+
+    def __init__(self, connect, size=4):
+        self.connect = connect # Opens a new sqlite3 connection
+        self.size = size # Largest number of connections
+        self.idle = queue.LifoQueue() # Connections not bound to a thread, the most recently used first
+        self.connections = [] # Every connection opened
+        self.lock = threading.Lock() # Guards 'connections'
+
+    # Take a connection, opening one if fewer than 'size' exist, otherwise waiting up to 'timeout' seconds for one
+    def acquire(self, timeout=None):
+        try:
+            return self.idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self.lock:
+            if len(self.connections) < self.size:
+                connection = PooledConnection(self.connect())
+                self.connections.append(connection)
+                return connection
+        try:
+            return self.idle.get(timeout=timeout)
+        except queue.Empty:
+            raise TimeoutError("No database connection became free within %s seconds" % timeout)
+
+    # Give a connection back to the pool
+    def release(self, connection):
+        self.idle.put(connection)
+
+    # Close every connection
+    def close(self):
+        with self.lock:
+            for connection in self.connections:
+                connection.con.close()
+            self.connections = []
+
 
 # Class for managing the database operations
+# The connection and cursor (self.con, self.cursor) belong to the calling thread: a thread gets a connection from the pool on first use
+# and keeps it, unless it uses the database inside 'with db.session():', which gives the connection back at the end
 class Database:
 
     '''CREATE the Users TABLE'''
@@ -17,20 +137,15 @@ class Database:
 
     '''Register a new user'''
     def register_user(self, username, password):
-        hashed_password = generate_password_hash(password)  # Hash the user's password before storing it
         try:
-            self.cursor.execute("INSERT INTO users (username, password) VALUES (?, ?)", (username, hashed_password)) # Insert the new user into the 'users' table
-            self.con.commit() # Commit the changes
+            self.create_user(username, password) # Hash the password and insert the new user into the 'users' table
         except sqlite3.IntegrityError:
             return False  # Return False if username already exists (violates the unique constraint)
         return True # Return True if registration was successful
 
     '''Authenticate the user'''
     def login_user(self, username, password):
-        user = self.cursor.execute("SELECT password FROM users WHERE username=?", (username,)).fetchone() # Query the 'users' table for the password corresponding to the provided username
-        if user and check_password_hash(user[0], password):
-            return True # Return True if login is successful
-        return False # Return False if login fails
+        return self.authenticate_user(username, password) is not None # Return True if login is successful, False if it fails
 
     '''CREATE the Tasks TABLE'''
     def create_task_table(self):
@@ -55,61 +170,451 @@ class Database:
         except sqlite3.OperationalError: # Ignore the error if the column already exists
             pass
 
+    # Adds the index used by every task query: a user's tasks, split by status, in creation order
+    def create_task_indexes(self):
+        self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_tasks_user_completed_id ON tasks(user_id, completed, id)")
+        self.con.commit() # Commit the change
+
+    # Adds the change tracking used to refresh the task list without reloading it
+    # Triggers give every inserted or updated task the user's next version number, and record deleted tasks with theirs
+    def create_task_versions(self):
+        try:
+            self.cursor.execute("ALTER TABLE tasks ADD COLUMN version INTEGER NOT NULL DEFAULT 0") # Version of the last change to the task
+        except sqlite3.OperationalError: # Ignore the error if the column already exists
+            pass
+        self.cursor.executescript("""
+            CREATE TABLE IF NOT EXISTS task_versions(
+                user_id INTEGER PRIMARY KEY,
+                version INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS deleted_tasks(
+                id INTEGER PRIMARY KEY,
+                user_id INTEGER,
+                version INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_tasks_user_version ON tasks(user_id, version);
+            CREATE INDEX IF NOT EXISTS idx_deleted_tasks_user_version ON deleted_tasks(user_id, version);
+
+            DROP TRIGGER IF EXISTS tasks_version_insert; -- Recreated, so databases set up by older versions get the current triggers
+            DROP TRIGGER IF EXISTS tasks_version_update;
+            DROP TRIGGER IF EXISTS tasks_version_delete;
+            CREATE TRIGGER tasks_version_insert AFTER INSERT ON tasks WHEN NEW.user_id IS NOT NULL BEGIN
+                INSERT INTO task_versions(user_id, version) VALUES (NEW.user_id, 1) ON CONFLICT(user_id) DO UPDATE SET version = version + 1;
+                UPDATE tasks SET version = (SELECT version FROM task_versions WHERE user_id = NEW.user_id) WHERE id = NEW.id;
+            END;
+            CREATE TRIGGER tasks_version_update AFTER UPDATE OF task, due_date, completed ON tasks WHEN NEW.user_id IS NOT NULL BEGIN
+                INSERT INTO task_versions(user_id, version) VALUES (NEW.user_id, 1) ON CONFLICT(user_id) DO UPDATE SET version = version + 1;
+                UPDATE tasks SET version = (SELECT version FROM task_versions WHERE user_id = NEW.user_id) WHERE id = NEW.id;
+            END;
+            CREATE TRIGGER tasks_version_delete AFTER DELETE ON tasks WHEN OLD.user_id IS NOT NULL BEGIN
+                INSERT INTO task_versions(user_id, version) VALUES (OLD.user_id, 1) ON CONFLICT(user_id) DO UPDATE SET version = version + 1;
+                INSERT OR REPLACE INTO deleted_tasks(id, user_id, version) VALUES (OLD.id, OLD.user_id, (SELECT version FROM task_versions WHERE user_id = OLD.user_id));
+            END;
+        """) # executescript commits first and runs every statement
+
+    # Adds the full-text search index of the task descriptions, kept in sync with the 'tasks' table by triggers
+    # The user ID is indexed as a token too, so a search only visits the matches of one user
+    def create_task_search(self):
+        exists = self.cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'tasks_fts'").fetchone()
+        self.cursor.executescript("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS tasks_fts USING fts5(task, user_id, content='tasks', content_rowid='id', prefix='1 2 3');
+
+            CREATE TRIGGER IF NOT EXISTS tasks_fts_insert AFTER INSERT ON tasks BEGIN
+                INSERT INTO tasks_fts(rowid, task, user_id) VALUES (NEW.id, NEW.task, NEW.user_id);
+            END;
+            CREATE TRIGGER IF NOT EXISTS tasks_fts_delete AFTER DELETE ON tasks BEGIN
+                INSERT INTO tasks_fts(tasks_fts, rowid, task, user_id) VALUES ('delete', OLD.id, OLD.task, OLD.user_id);
+            END;
+            CREATE TRIGGER IF NOT EXISTS tasks_fts_update AFTER UPDATE OF task, user_id ON tasks BEGIN
+                INSERT INTO tasks_fts(tasks_fts, rowid, task, user_id) VALUES ('delete', OLD.id, OLD.task, OLD.user_id);
+                INSERT INTO tasks_fts(rowid, task, user_id) VALUES (NEW.id, NEW.task, NEW.user_id);
+            END;
+        """)
+        if not exists: # Index the tasks created before search existed
+            self.cursor.execute("INSERT INTO tasks_fts(tasks_fts) VALUES ('rebuild')")
+            self.con.commit() # Commit the change
+
+    # Converts due dates stored by older versions (e.g. 'Monday 01 January 2024') to ISO dates, and indexes them
+    def migrate_due_dates(self):
+        rows = self.cursor.execute("SELECT id, due_date FROM tasks WHERE due_date NOT GLOB '[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]'").fetchall()
+        converted = []
+        for task_id, due_date in rows:
+            try:
+                converted.append((to_iso_date(due_date), task_id))
+            except ValueError: # Looks like an ISO date but isn't one, e.g. '2024-02-31'
+                pass
+        self.cursor.executemany("UPDATE tasks SET due_date = ? WHERE id = ?", (row for row in converted if ISO_DATE.fullmatch(row[0] or ''))) # Leave text that isn't a date as it is
+        self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_tasks_user_completed_due ON tasks(user_id, completed, due_date)")
+        self.con.commit() # Commit the changes
+
+    # Adds the per-user and per-day task statistics, kept up to date by triggers on the 'tasks' table
+    # user_stats: tasks ever created, tasks completed (less those marked incomplete again) and tasks still open
+    # daily_stats: tasks created and tasks completed on each day, so history is read from one row per day
+    def create_stats_tables(self):
+        exists = self.cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'user_stats'").fetchone()
+        self.cursor.executescript("""
+            CREATE TABLE IF NOT EXISTS user_stats(
+                user_id INTEGER PRIMARY KEY,
+                tasks_created INTEGER NOT NULL DEFAULT 0,
+                tasks_completed INTEGER NOT NULL DEFAULT 0,
+                tasks_open INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE TABLE IF NOT EXISTS daily_stats(
+                user_id INTEGER NOT NULL,
+                day TEXT NOT NULL,
+                tasks_created INTEGER NOT NULL DEFAULT 0,
+                tasks_completed INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (user_id, day)
+            ) WITHOUT ROWID;
+
+            DROP TRIGGER IF EXISTS tasks_stats_insert; -- Recreated, so databases set up by older versions get the current triggers
+            DROP TRIGGER IF EXISTS tasks_stats_update;
+            DROP TRIGGER IF EXISTS tasks_stats_delete;
+            CREATE TRIGGER tasks_stats_insert AFTER INSERT ON tasks WHEN NEW.user_id IS NOT NULL BEGIN
+                INSERT INTO user_stats(user_id, tasks_created, tasks_completed, tasks_open) VALUES (NEW.user_id, 1, NEW.completed, 1 - NEW.completed)
+                    ON CONFLICT(user_id) DO UPDATE SET tasks_created = tasks_created + 1, tasks_completed = tasks_completed + NEW.completed, tasks_open = tasks_open + 1 - NEW.completed;
+                INSERT INTO daily_stats(user_id, day, tasks_created, tasks_completed) VALUES (NEW.user_id, date('now', 'localtime'), 1, NEW.completed)
+                    ON CONFLICT(user_id, day) DO UPDATE SET tasks_created = tasks_created + 1, tasks_completed = tasks_completed + NEW.completed;
+            END;
+            CREATE TRIGGER tasks_stats_update AFTER UPDATE OF completed ON tasks WHEN NEW.completed != OLD.completed AND NEW.user_id IS NOT NULL BEGIN
+                UPDATE user_stats SET tasks_completed = tasks_completed + NEW.completed - OLD.completed, tasks_open = tasks_open - NEW.completed + OLD.completed
+                    WHERE user_id = NEW.user_id;
+                INSERT INTO daily_stats(user_id, day, tasks_completed) VALUES (NEW.user_id, date('now', 'localtime'), NEW.completed - OLD.completed)
+                    ON CONFLICT(user_id, day) DO UPDATE SET tasks_completed = tasks_completed + NEW.completed - OLD.completed;
+            END;
+            CREATE TRIGGER tasks_stats_delete AFTER DELETE ON tasks WHEN OLD.user_id IS NOT NULL BEGIN
+                UPDATE user_stats SET tasks_open = tasks_open - 1 + OLD.completed WHERE user_id = OLD.user_id;
+            END;
+        """)
+        if not exists: # Count the tasks created before statistics existed, their days are unknown
+            self.cursor.execute("""
+                INSERT INTO user_stats(user_id, tasks_created, tasks_completed, tasks_open)
+                SELECT user_id, COUNT(*), SUM(completed), SUM(1 - completed) FROM tasks WHERE user_id IS NOT NULL GROUP BY user_id
+            """)
+            self.con.commit() # Commit the changes
+
     # Initialisation method to set up the database connection and create tables
-    def __init__(self):
-        self.con = sqlite3.connect('todo.db') # Connect to the 'todo.db' SQLite database
-        self.cursor = self.con.cursor() # Create a cursor object to execute SQL commands
+    # With write_behind=True, writes are grouped into one transaction that is committed by flush():
+    # when 'flush_threshold' writes are waiting, when flush_if_due() finds them older than 'flush_interval' seconds, or on close
+    # 'hasher' hashes and checks passwords, by default a PasswordHasher with the default work factor
+    # 'pool_size' is the largest number of threads using the database at once
+    def __init__(self, path='todo.db', write_behind=False, flush_interval=0.5, flush_threshold=100, hasher=None, pool_size=4):
+        self.path = path # SQLite database file ('todo.db' by default)
+        self.write_behind = write_behind # Whether commits are batched
+        self.flush_interval = flush_interval # Longest time (in seconds) a write waits for its commit
+        self.flush_threshold = flush_threshold # Number of waiting writes that forces a commit
+        self.hasher = hasher or PasswordHasher() # Hashes passwords on worker threads
+        self.pool = ConnectionPool(self.open_connection, pool_size) # Connections shared by the threads
+        self.local = threading.local() # The connection bound to each thread
+        if profiler.enabled: # Time every public method, nothing is wrapped otherwise
+            profiler.instrument(self, 'db', exclude=('connection', 'session', 'open_connection'))
+        with self.session(): # Give the connection back once the tables are set up
+            self.migrate() # Set up or upgrade the schema, only if an older version of the app created the database
+
+    '''Schema version'''
+    # Bring the schema up to SCHEMA_VERSION, a database that is already up to date costs one PRAGMA read
+    # Every step is safe to run again, so a database created before versions were tracked (user_version 0) just runs them all
+    def migrate(self):
+        if self.cursor.execute("PRAGMA user_version").fetchone()[0] >= SCHEMA_VERSION:
+            return
         self.create_user_table() # Create the 'users' table
         self.create_task_table() # Create the 'tasks' table
         self.add_user_id_column() # Ensure the 'user_id' column is present in the 'tasks' table
+        self.create_task_indexes() # Ensure the task indexes exist, also on databases created by older versions
+        self.create_task_versions() # Ensure task changes are tracked
+        self.create_task_search() # Ensure the tasks can be searched
+        self.migrate_due_dates() # Ensure due dates are stored as ISO dates
+        self.create_stats_tables() # Ensure task statistics are kept
+        self.cursor.execute("PRAGMA user_version = %d" % SCHEMA_VERSION) # Skip the steps on the next launch
+        self.con.commit()
+
+    # Open a new connection to the database, called by the pool
+    def open_connection(self):
+        factory = ProfiledConnection if profiler.enabled else sqlite3.Connection # Times every statement and commit when profiling
+        con = sqlite3.connect(self.path, check_same_thread=False, factory=factory) # The pool hands it to one thread at a time
+        if self.write_behind:
+            con.execute("PRAGMA journal_mode=WAL") # Readers don't block the writer, and commits append to the log instead of rewriting pages
+            con.execute("PRAGMA synchronous=NORMAL") # Only fsync at checkpoints, a power cut may lose the last commits but never corrupts the database
+        return con
+
+    '''The connection of the calling thread'''
+    # The pooled connection bound to the calling thread, taken from the pool on first use
+    def connection(self):
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            connection = self.local.connection = self.pool.acquire()
+        return connection
+
+    @property
+    def con(self): # The calling thread's sqlite3 connection
+        return self.connection().con
+
+    @property
+    def cursor(self): # The calling thread's cursor
+        return self.connection().cursor
+
+    # Bind a connection to the calling thread for the duration of a 'with' block, then commit its writes and give it back
+    # Inside a session that is already open, or on a thread that keeps its connection, this does nothing
+    @contextmanager
+    def session(self):
+        if getattr(self.local, 'connection', None) is not None:
+            yield self
+            return
+        connection = self.connection()
+        try:
+            yield self
+        except BaseException:
+            self.rollback() # Undo the writes of the failed block
+            raise
+        finally:
+            try:
+                self.flush() # Other threads will use the connection next
+                if connection.con.in_transaction: # A failed statement left a transaction open, it would keep the write lock
+                    self.rollback()
+            finally:
+                self.pool.release(connection)
+                self.local.connection = None
+
+    '''Committing the changes'''
+    # Commit a write straight away, or in write-behind mode leave it in the open transaction for flush()
+    def commit(self):
+        connection = self.connection()
+        if not self.write_behind:
+            connection.con.commit() # Commit the changes
+            return
+        connection.pending_writes += 1
+        if connection.first_pending is None:
+            connection.first_pending = time.monotonic() # Start timing the oldest waiting write
+        if connection.pending_writes >= self.flush_threshold: # Too many writes waiting, commit them now
+            self.flush()
+
+    # Undo every write of the calling thread that isn't committed yet
+    def rollback(self):
+        connection = self.connection()
+        connection.con.rollback()
+        connection.pending_writes = 0
+        connection.first_pending = None
+
+    # Commit every waiting write of the calling thread in one transaction
+    # A transaction left open by a failed write is ended too, so the connection doesn't keep the write lock
+    def flush(self):
+        connection = self.connection()
+        if connection.pending_writes or connection.con.in_transaction:
+            connection.con.commit() # Commit the changes
+        connection.pending_writes = 0
+        connection.first_pending = None
+
+    # Commit the waiting writes if the oldest one has waited 'flush_interval' seconds, call this from a timer
+    def flush_if_due(self):
+        connection = self.connection()
+        if connection.first_pending is not None and time.monotonic() - connection.first_pending >= self.flush_interval:
+            self.flush()
 
     # Manually create a user
+    # Raises sqlite3.IntegrityError if the username is taken
     def create_user(self, username, password):
-        self.cursor.execute("INSERT INTO users(username, password) VALUES(?, ?)", (username, password))
-        self.con.commit() # Commit the changes
+        hashed_password = self.hasher.hash(password) # Hash the user's password before storing it
+        try:
+            self.cursor.execute("INSERT INTO users(username, password) VALUES(?, ?)", (username, hashed_password))
+        except sqlite3.IntegrityError:
+            if not self.connection().pending_writes: # The failed INSERT began a transaction that no flush would end, end it now
+                self.rollback()
+            raise
+        self.commit() # Commit the changes
 
     # Authenticate the user by checking both the username and password
+    # Passwords stored as plain text or with an older work factor are hashed again with the current one
     def authenticate_user(self, username, password):
-        user = self.cursor.execute("SELECT * FROM users WHERE username = ? AND password = ?",
-                                   (username, password)).fetchone()
-        return user # Return the user if found, or None if authentication fails
+        user = self.cursor.execute("SELECT id, username, password FROM users WHERE username = ?", (username,)).fetchone()
+        if user is None or not self.hasher.verify(user[2], password):
+            return None # Return None if authentication fails
+        if self.hasher.needs_rehash(user[2]):
+            self.cursor.execute("UPDATE users SET password = ? WHERE id = ?", (self.hasher.hash(password), user[0]))
+            self.commit() # Commit the changes
+        return user[:2] # Return the user's ID and username
 
 
     '''CREATE A Task'''
     def create_task(self, user_id, task, due_date=None):
+        due_date = to_iso_date(due_date) # Store the due date as an ISO date
         self.cursor.execute("INSERT INTO tasks(user_id, task, due_date, completed) VALUES(?, ?, ?, ?)", (user_id, task, due_date, 0)) # Insert a new task into the 'tasks' table with the provided user_id, task description, due date, and default completion status (0 = incomplete)
-        self.con.commit() # Commit the changes
-        created_task = self.cursor.execute("SELECT id, task, due_date FROM tasks WHERE task = ? and completed = 0 AND user_id = ?", (task, user_id)).fetchall() # Retrieve the task just created, filtering by the task description, user, and completion status
-        return created_task[-1] # Return the last task created (in case of multiple matches)
+        task_id = self.cursor.lastrowid # ID SQLite gave the inserted row, read before anything else runs on the cursor
+        self.commit() # Commit the changes
+        return task_id, task, due_date # Return the created task without querying it again
+
+    '''CREATE many Tasks'''
+    # Insert many tasks in one transaction, 'tasks' yields task descriptions or (task, due_date) pairs
+    def create_tasks(self, user_id, tasks):
+        rows = ((user_id, task, None, 0) if isinstance(task, str) else (user_id, task[0], to_iso_date(task[1]) if len(task) > 1 else None, 0) for task in tasks) # Build the rows lazily so any iterable (e.g. a CSV reader) can be passed
+        self.cursor.execute("SAVEPOINT create_tasks") # Lets a failed import be undone without losing other waiting writes
+        try:
+            self.cursor.executemany("INSERT INTO tasks(user_id, task, due_date, completed) VALUES(?, ?, ?, ?)", rows)
+        except Exception:
+            self.cursor.execute("ROLLBACK TO create_tasks") # Insert none of the tasks if one of them fails
+            self.cursor.execute("RELEASE create_tasks")
+            raise
+        count = self.cursor.rowcount # Number of tasks inserted
+        self.cursor.execute("RELEASE create_tasks")
+        self.commit() # Commit every task at once
+        return count # Return the number of tasks created
+
+    '''Exporting and importing the tasks'''
+    # Write every task of a user to a text stream, as JSON Lines or CSV (see EXPORT_FORMATS), and return the number written
+    # Rows are read from the cursor and written one at a time, so memory use doesn't grow with the number of tasks
+    def export_tasks(self, user_id, stream, format='jsonl'):
+        if format not in EXPORT_FORMATS:
+            raise ValueError("Unknown format %r, expected one of %s" % (format, ', '.join(EXPORT_FORMATS)))
+        cursor = self.con.cursor() # Its own cursor, so using self.cursor meanwhile doesn't end the export
+        cursor.arraysize = 1000 # Rows fetched from SQLite at a time
+        cursor.execute("SELECT task, due_date, completed FROM tasks WHERE user_id = ? ORDER BY id", (user_id,))
+        count = 0
+        if format == 'csv':
+            writer = csv.writer(stream)
+            writer.writerow(EXPORT_FIELDS)
+            for row in cursor:
+                writer.writerow(row)
+                count += 1
+        else:
+            for task, due_date, completed in cursor:
+                stream.write(json.dumps({'task': task, 'due_date': due_date, 'completed': bool(completed)}) + '\n')
+                count += 1
+        cursor.close()
+        return count
+
+    # Add the tasks exported by export_tasks from a text stream to a user's tasks, and return the number added
+    # The stream is parsed lazily and inserted 'batch_size' tasks per transaction, so memory use stays flat
+    # A line that can't be read raises ValueError, the batches committed before it are kept
+    def import_tasks(self, user_id, stream, format='jsonl', batch_size=10000):
+        rows = ((user_id,) + row for row in read_tasks(stream, format))
+        count = 0
+        while True:
+            batch = list(islice(rows, batch_size))
+            if not batch:
+                return count
+            self.cursor.executemany("INSERT INTO tasks(user_id, task, due_date, completed) VALUES(?, ?, ?, ?)", batch)
+            count += len(batch)
+            self.commit()
+            self.flush() # End the batch's transaction, also with write-behind
 
     '''READ / GET the tasks'''
     def get_tasks(self, user_id):
-        complete_tasks = self.cursor.execute("SELECT id, task, due_date FROM tasks WHERE completed = 1 AND user_id = ?", (user_id,)).fetchall() # Retrieve all completed tasks for the given user
-        incomplete_tasks = self.cursor.execute("SELECT id, task, due_date FROM tasks WHERE completed = 0 AND user_id = ?", (user_id,)).fetchall()  # Retrieve all incomplete tasks for the given user
+        # Retrieve all of the user's tasks in one pass over the (user_id, completed, id) index: incomplete tasks first, then completed ones
+        tasks = self.cursor.execute("SELECT id, task, due_date, completed FROM tasks WHERE user_id = ? ORDER BY completed, id", (user_id,))
+        incomplete_tasks, complete_tasks = [], []
+        for task_id, task, due_date, completed in tasks:
+            (complete_tasks if completed else incomplete_tasks).append((task_id, task, due_date)) # Split the rows by completion status
         return incomplete_tasks, complete_tasks # Return both incomplete and complete tasks
 
+    # Retrieve one page of the user's complete or incomplete tasks, starting after the task ID 'after_id'
+    # Keyset pagination: every page is a short range scan of the index, so the 1000th page costs the same as the first
+    def get_tasks_page(self, user_id, completed, after_id=0, limit=50):
+        return self.cursor.execute("SELECT id, task, due_date FROM tasks WHERE user_id = ? AND completed = ? AND id > ? ORDER BY id LIMIT ?",
+                                   (user_id, int(completed), after_id, limit)).fetchall() # Pass the ID of the last task returned as 'after_id' to get the next page
+
+    '''SEARCH the tasks'''
+    # Retrieve the user's tasks containing words starting with every word of 'query', the shortest of the newest matches first
+    # Returns a list of (id, task, due_date, completed)
+    def search_tasks(self, user_id, query, limit=50):
+        words = query.split()
+        if not words:
+            return []
+        terms = ' '.join('"' + word.replace('"', '""') + '"*' for word in words) # Quote every word so the query can't use FTS5 syntax, * makes it a prefix search
+        match = 'user_id : "%d" AND task : (%s)' % (user_id, terms)
+        # Every match contains every word, so bm25 would only tell them apart by length: rank the shortest, i.e. closest, matches first
+        # Sorting on length avoids bm25's scan of every task in the index containing each word, the slow part on large databases
+        # Only the newest SEARCH_CANDIDATES matches are ranked, FTS5 reads them in rowid order and stops, so a user with
+        # hundreds of thousands of tasks doesn't make every keystroke sort all of their matches
+        return self.cursor.execute("""
+            SELECT tasks.id, tasks.task, tasks.due_date, tasks.completed
+            FROM (SELECT rowid FROM tasks_fts WHERE tasks_fts MATCH ? ORDER BY rowid DESC LIMIT ?) AS hits JOIN tasks ON tasks.id = hits.rowid
+            ORDER BY length(tasks.task), tasks.id DESC LIMIT ?
+        """, (match, max(SEARCH_CANDIDATES, limit), limit)).fetchall()
+
+    '''READ / GET the tasks by due date'''
+    # Retrieve the user's tasks due from 'start' to 'end' (dates or ISO date strings, both included), soonest first
+    # 'completed' selects incomplete (False) or completed (True) tasks only, by default both are returned
+    # Returns a list of (id, task, due_date, completed), found with a range scan of the (user_id, completed, due_date) index
+    def get_tasks_due_between(self, user_id, start, end, completed=None):
+        statuses = (0, 1) if completed is None else (int(completed),)
+        return self.cursor.execute("""
+            SELECT id, task, due_date, completed FROM tasks
+            WHERE user_id = ? AND completed IN (%s) AND due_date BETWEEN ? AND ? ORDER BY due_date, id
+        """ % ', '.join('?' * len(statuses)), (user_id, *statuses, to_iso_date(start), to_iso_date(end))).fetchall()
+
+    # Retrieve the user's tasks due today, complete or not
+    def get_tasks_due_today(self, user_id, today=None):
+        today = today or date.today()
+        return self.get_tasks_due_between(user_id, today, today)
+
+    # Retrieve the user's incomplete tasks that were due before today, oldest first
+    def get_overdue_tasks(self, user_id, today=None):
+        today = to_iso_date(today or date.today())
+        return self.cursor.execute("SELECT id, task, due_date, completed FROM tasks WHERE user_id = ? AND completed = 0 AND due_date GLOB '[0-9]*' AND due_date < ? ORDER BY due_date, id",
+                                   (user_id, today)).fetchall() # GLOB skips due dates that aren't dates
+
+    '''READ / GET the statistics'''
+    # Retrieve the user's task statistics: (tasks created, tasks completed, tasks open)
+    def get_user_stats(self, user_id):
+        stats = self.cursor.execute("SELECT tasks_created, tasks_completed, tasks_open FROM user_stats WHERE user_id = ?", (user_id,)).fetchone()
+        return stats or (0, 0, 0) # No task was ever created
+
+    # Retrieve the tasks created and the tasks completed on each of the last 'days' days, oldest first
+    # Returns a list of (day, tasks created, tasks completed). Completions count on the day they happen, whenever the task was created,
+    # so the two are separate counts rather than a rate. Unchecking a task completed on an earlier day can't make a day negative
+    def get_completion_history(self, user_id, days=7, today=None):
+        today = today or date.today()
+        first_day = date.fromordinal(today.toordinal() - days + 1)
+        rows = dict((day, (created, completed)) for day, created, completed in self.cursor.execute(
+            "SELECT day, tasks_created, tasks_completed FROM daily_stats WHERE user_id = ? AND day BETWEEN ? AND ?",
+            (user_id, first_day.isoformat(), today.isoformat()))) # One row per day at most
+        history = []
+        for ordinal in range(first_day.toordinal(), today.toordinal() + 1): # Days without a row had no activity
+            day = date.fromordinal(ordinal).isoformat()
+            created, completed = rows.get(day, (0, 0))
+            history.append((day, created, max(completed, 0))) # Completions minus un-completions, at least 0
+        return history
+
+    # Current version of the user's tasks, pass it to get_tasks_changed_since() later to get what changed in between
+    def get_task_version(self, user_id):
+        version = self.cursor.execute("SELECT version FROM task_versions WHERE user_id = ?", (user_id,)).fetchone()
+        return version[0] if version else 0 # No task was ever created
+
+    # Retrieve the tasks created or updated and the IDs of the tasks deleted after 'version', both range scans of an index
+    # Returns (tasks, deleted task IDs, current version), each task being (id, task, due_date, completed)
+    def get_tasks_changed_since(self, user_id, version):
+        current_version = self.get_task_version(user_id)
+        tasks = self.cursor.execute("SELECT id, task, due_date, completed FROM tasks WHERE user_id = ? AND version > ?", (user_id, version)).fetchall()
+        deleted = self.cursor.execute("SELECT id FROM deleted_tasks WHERE user_id = ? AND version > ?", (user_id, version)).fetchall()
+        return tasks, [row[0] for row in deleted], current_version
+
     '''UPDATING the tasks status'''
     # Mark a task as completed by setting the 'completed' field to 1 for the given user and task ID
     def mark_task_as_complete(self, user_id, taskid):
         self.cursor.execute("UPDATE tasks SET completed=1 WHERE id=? AND user_id=?", (taskid, user_id))
-        self.con.commit() # Commit the changes
+        self.commit() # Commit the changes
+        return self.cursor.rowcount > 0 # Whether the user had a task with this ID
 
     # Mark a task as incomplete by setting the 'completed' field to 0 for the given user and task ID
     def mark_task_as_incomplete(self, user_id, taskid):
         self.cursor.execute("UPDATE tasks SET completed=0 WHERE id=? AND user_id=?", (taskid, user_id))
-        self.con.commit() # Commit the changes
-        # Retrieve and return the task description (text) after marking it as incomplete
-        task_text = self.cursor.execute("SELECT task FROM tasks WHERE id=? AND user_id=?", (taskid, user_id)).fetchall()
-        return task_text[0][0] if task_text else None # Return task text if it exists, else return None
+        self.commit() # Commit the changes
+        return self.cursor.rowcount > 0 # Whether the user had a task with this ID
 
 
     '''Deleting the task'''
     # Delete a task from the 'tasks' table for the given user and task ID
     def delete_task(self, user_id, taskid):
         self.cursor.execute("DELETE FROM tasks WHERE id=? AND user_id=?", (taskid, user_id))
-        self.con.commit() # Commit the changes
+        self.commit() # Commit the changes
+        return self.cursor.rowcount > 0 # Whether the user had a task with this ID
 
     '''Closing the connection '''
-    # Close the database connection
+    # Close every database connection, committing any writes still waiting so nothing is lost on a clean shutdown
+    # Call it once the other threads are done with the database
     def close_db_connection(self):
-        self.con.close()
\ No newline at end of file
+        for connection in self.pool.connections:
+            if connection.pending_writes:
+                connection.con.commit() # Commit the writes still waiting
+        self.pool.close()
+        self.local = threading.local() # Forget the closed connections
+        self.hasher.close() # Stop the password hashing threads
\ No newline at end of file
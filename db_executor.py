@@ -0,0 +1,78 @@
+import queue # Thread-safe queue of database jobs
+import threading # Worker thread that runs the database jobs
+from concurrent.futures import Future # Result of a job, filled in by the worker thread
+
+from database import Database # Custom database class for app data
+
+# Class for running database operations on a worker thread, so slow queries never block the UI
+class DatabaseExecutor:
+
+    # Start the worker thread, it opens its own Database(**database_kwargs) connection
+    # 'schedule' is called with a function that must be run on the UI thread, e.g. through Kivy's Clock
+    def __init__(self, schedule=None, **database_kwargs):
+        self.schedule = schedule or (lambda fn: fn()) # Without a scheduler, callbacks run on the worker thread
+        self.database_kwargs = database_kwargs # Arguments for the worker's Database
+        self.jobs = queue.Queue() # Jobs waiting for the worker thread
+        self.flush_interval = database_kwargs.get('flush_interval', 0.5) # How often write-behind commits are checked
+        self.thread = threading.Thread(target=self.run, name='database', daemon=True)
+        self.thread.start()
+
+    '''Submitting jobs'''
+    # Run the Database method 'method' (a name, or a function taking the Database) with the given arguments on the worker thread
+    # Returns a Future. 'callback' gets the result and 'error_callback' the exception, both on the UI thread
+    # Without an 'error_callback' the exception is raised on the UI thread, just like a direct call would
+    def submit(self, method, *args, callback=None, error_callback=None, **kwargs):
+        future = Future()
+        future.add_done_callback(lambda done: self.schedule(lambda: self.deliver(done, callback, error_callback)))
+        self.jobs.put((method, args, kwargs, future))
+        return future
+
+    # Hand the result of a finished job to its callback, runs on the UI thread
+    def deliver(self, future, callback, error_callback):
+        if future.cancelled(): # Stale jobs cancelled before they ran have nothing to report
+            return
+        error = future.exception()
+        if error is not None:
+            if error_callback is None:
+                raise error # Surface the error like a direct database call would
+            error_callback(error)
+        elif callback is not None:
+            callback(future.result())
+
+    '''Worker thread'''
+    def run(self):
+        try:
+            db = Database(**self.database_kwargs) # The connection belongs to this thread
+        except Exception as error: # Fail every job if the database can't be opened
+            db, open_error = None, error
+        timeout = self.flush_interval if self.database_kwargs.get('write_behind') else None
+        while True:
+            try:
+                job = self.jobs.get(timeout=timeout)
+            except queue.Empty: # Idle, commit any writes that have waited long enough
+                if db is not None:
+                    db.flush_if_due()
+                continue
+            if job is None: # close() was called
+                break
+            method, args, kwargs, future = job
+            if not future.set_running_or_notify_cancel(): # Cancelled while waiting in the queue
+                continue
+            try:
+                if db is None:
+                    raise open_error
+                result = method(db, *args, **kwargs) if callable(method) else getattr(db, method)(*args, **kwargs)
+            except BaseException as error:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+            if timeout is not None and db is not None:
+                db.flush_if_due() # Commit waiting writes even while jobs keep arriving
+        if db is not None:
+            db.close_db_connection() # Commits any writes still waiting
+
+    '''Closing the executor'''
+    # Run the jobs already submitted, then close the database connection and stop the worker thread
+    def close(self):
+        self.jobs.put(None)
+        self.thread.join()
@@ -1,37 +1,77 @@
 # Packages and dependencies
+# Dialogs, the date picker and the dialog buttons are slow to import, they are imported when a dialog is first opened
 from kivymd.app import MDApp # Base class for Kivy MD app
-from kivymd.uix.dialog import MDDialog # Class for creating dialogs
 from kivymd.uix.boxlayout import MDBoxLayout # Layout to organise widgets in a box
-from kivymd.uix.pickers import MDDatePicker # Date picker widget
 
 from kivymd.uix.list import TwoLineAvatarIconListItem, ILeftBodyTouch # List item with two lines and an avatar/icon
 from kivymd.uix.selectioncontrol import MDCheckbox # Checkbox widget
 
-from datetime import datetime # For working with date and time for task creation
+from datetime import date, datetime # For working with date and time for task creation
+import time # Timing the UI handlers when profiling
 
+from kivy.clock import Clock # Schedules functions on the UI loop
 from kivy.uix.screenmanager import ScreenManager, Screen # Manages and switches between different screens
 from kivy.uix.boxlayout import BoxLayout # Box layout for organizing widgets
-from kivy.properties import ObjectProperty # Property that is referenced in KV file
-from kivymd.uix.button import MDRaisedButton, MDFlatButton # Raised and flat button widgets
-from kivymd.uix.textfield import MDTextField # Text input widget
+from kivy.uix.label import Label # Text of the profiling overlay
+from kivy.uix.recycleview.views import RecycleDataViewBehavior # Lets a widget be reused by a RecycleView for different rows
+from kivy.properties import ObjectProperty, StringProperty, NumericProperty # Properties that are referenced in KV file
 
-from database import Database # Custom database class for app data
+from database import DISPLAY_DATE_FORMAT, ISO_DATE # How due dates are shown and stored
+from db_executor import DatabaseExecutor # Runs the database on a worker thread
+from profiling import profiler # Timing statistics, recorded only when the TODO_PROFILE environment variable is set
 
-db = Database() # Initialises the database
+# Initialises the database on its own thread, batching commits so taps don't wait for the disk
+# Results are handed back to the UI thread through the Clock
+db = DatabaseExecutor(schedule=lambda fn: Clock.schedule_once(lambda dt: fn()), write_behind=True)
+
+PAGE_SIZE = 50 # Number of tasks loaded at a time, more than fit on one screen
+SEARCH_DELAY = 0.15 # Seconds without typing before a search runs
+PAUSE_FLUSH_TIMEOUT = 2 # Seconds on_pause waits for the waiting writes to be committed
+PROFILED_HANDLERS = ('load_tasks', 'on_tasks_page', 'refresh_tasks', 'reconcile_tasks', 'add_task', 'on_task_created',
+                     'set_task_completed', 'remove_task', 'run_search', 'on_search_results') # MainApp methods timed when profiling
+F12 = 293 # Key code of F12, shows or hides the profiling overlay
+
+
+def task_text(task, completed): # Build the display text of a task row
+    return '[s]' + str(task) + '[/s]' if completed else str(task) # Strike-through the text of completed tasks
+
+
+def format_due_date(due_date): # Turn a stored ISO due date into the text shown to the user
+    if due_date and ISO_DATE.fullmatch(due_date):
+        try:
+            return datetime.strptime(due_date, '%Y-%m-%d').strftime(DISPLAY_DATE_FORMAT) # e.g. 'Monday 01 January 2024'
+        except ValueError: # Looks like a date but there is no such day, e.g. stored by an older version
+            pass
+    return due_date or '' # No due date, or text that isn't a date
+
+
+def task_row(pk, task, due_date, completed=False): # Build the dict that describes one row of the task list
+    return {
+        'pk': pk, # Primary key (task ID)
+        'task': task, # Raw task description, kept so the text can be rebuilt without a database round-trip
+        'completed': completed, # Completion status shown by the checkbox
+        'text': task_text(task, completed), # Text shown on the first line
+        'secondary_text': format_due_date(due_date), # Task date shown on the second line
+    }
 
 # Creates the login screen
 class LoginScreen(Screen): # Screen for user login
     def attempt_login(self, username, password): # Function to handle login attempts
-        user = db.authenticate_user(username, password) # Check if the user exists in the database
+        db.submit('authenticate_user', username, password, callback=self.on_login) # Check if the user exists in the database
+
+    def on_login(self, user): # Called with the result of the login attempt
         if user: # If user exists
             app = MDApp.get_running_app() # Get current app instance
             app.user_id = user[0]  # Store the logged-in user's ID
-            app.root.current = 'main' # Switch to the main screen
+            app.username = user[1] # Store the logged-in user's name
+            app.switch_screen('main') # Switch to the main screen, which loads the user's tasks
         else: # If login failed
             self.ids.login_message.text = "Login failed. Please check your username and password." # Show error message
 
     def open_register_dialog(self): # Function to open the registration dialog
         if not hasattr(self, 'register_dialog'): # Check if the dialog already exists
+            from kivymd.uix.dialog import MDDialog # Class for creating dialogs
+            from kivymd.uix.button import MDRaisedButton, MDFlatButton # Raised and flat button widgets
             self.register_dialog = MDDialog( # Create a registration dialog if not already open
                 title="Register",
                 type="custom",
@@ -56,15 +96,17 @@ class LoginScreen(Screen): # Screen for user login
         password = register_content.ids.password.text # Get password input
 
         if username and password: # If username and password are provided
-            try:
-                db.create_user(username, password) # Try to create a new user in the database
-                self.ids.login_message.text = "Registration successful! You can now log in." # Show success message
-                self.close_register_dialog() # Close the dialog
-            except Exception as e: # If registration fails
-                self.ids.login_message.text = f"Registration failed: {str(e)}" # Show error message
+            db.submit('create_user', username, password, callback=self.on_registered, error_callback=self.on_register_failed) # Try to create a new user in the database
         else: # If either field is empty
             self.ids.login_message.text = "Please enter both a username and password." # Show validation message
 
+    def on_registered(self, result): # The new user was created
+        self.ids.login_message.text = "Registration successful! You can now log in." # Show success message
+        self.close_register_dialog() # Close the dialog
+
+    def on_register_failed(self, e): # If registration fails
+        self.ids.login_message.text = f"Registration failed: {str(e)}" # Show error message
+
     def close_register_dialog(self, *args): # Close the registration dialog
         self.register_dialog.dismiss() # Close/dismiss the dialog
 
@@ -72,8 +114,11 @@ class RegisterContent(MDBoxLayout): # Custom layout for registration dialog cont
     pass
 
     def validate_user(self): # Validate user login attempt
-        if db.login_user(self.username.text, self.password.text): # Check credentials
-            self.manager.current = "main"  # Switch to the main screen if valid
+        db.submit('login_user', self.username.text, self.password.text, callback=self.on_validated) # Check credentials
+
+    def on_validated(self, valid): # Called with the result of the credentials check
+        if valid:
+            MDApp.get_running_app().switch_screen("main")  # Switch to the main screen if valid
         else:
             print("Invalid credentials")  # Print error message
 
@@ -83,93 +128,302 @@ class RegisterScreen(Screen): # Screen for user registration
     password = ObjectProperty(None) # Reference to password input from KV file
 
     def register(self): # Function to register the user
-        if db.register_user(self.username.text, self.password.text): # Register user in the database
+        db.submit('register_user', self.username.text, self.password.text, callback=self.on_registered) # Register user in the database
+
+    def on_registered(self, registered): # Called with the result of the registration
+        if registered:
             print("User registered successfully") # Print success message
-            self.manager.current = "login"  # Switch back to the login screen
+            MDApp.get_running_app().switch_screen("login")  # Switch back to the login screen
         else:
             print("Username already exists") # Print error if username exists
 
 # Main task screen
 class MainScreen(Screen): # Screen to display tasks
-    pass
+    def on_pre_enter(self, *args): # Called every time the screen is about to be shown
+        app = MDApp.get_running_app()
+        self.ids.search_field.text = '' # Start without a search
+        app.end_search() # Show the task list again straight away
+        app.load_tasks() # Load the tasks, or only what changed since they were last loaded
 
 class ProfileScreen(Screen): # Screen to display user profile
-    username = "Admin" # Default username
+    username = StringProperty("") # Name of the logged-in user
     password = "********" # Default password
-    total_tasks_created = 52 # Example total tasks created
-    total_tasks_completed = 46 # Example total tasks completed
+    total_tasks_created = NumericProperty(0) # Tasks the user ever created
+    total_tasks_completed = NumericProperty(0) # Tasks the user completed
+    weekly_completion = StringProperty("") # Tasks created and tasks completed over the last week
+
+    def on_pre_enter(self, *args): # Called every time the screen is about to be shown
+        app = MDApp.get_running_app()
+        self.username = app.username or ""
+        db.submit('get_user_stats', app.user_id, callback=self.on_stats) # One row, kept up to date by the database
+        db.submit('get_completion_history', app.user_id, 7, callback=self.on_history) # One row per day
+
+    def on_stats(self, stats): # Called with (tasks created, tasks completed, tasks open)
+        self.total_tasks_created, self.total_tasks_completed, open_tasks = stats
+
+    def on_history(self, history): # Called with (day, tasks created, tasks completed) for the last 7 days
+        created = sum(day[1] for day in history)
+        completed = sum(day[2] for day in history) # Includes tasks created before this week
+        self.weekly_completion = "{} tasks created, {} completed".format(created, completed)
 
 
 class DialogContent(MDBoxLayout): # Custom layout for dialog content
     """Opens a Dialog Box That Gets The Task From The User"""
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
-        self.ids.date_text.text = str(datetime.now().strftime('%A %d %B %Y')) # Set the date in the dialog
+        self.due_date = date.today() # The task is due today unless another date is picked
+        self.ids.date_text.text = self.due_date.strftime(DISPLAY_DATE_FORMAT) # Set the date in the dialog
 
     #This function will show the date picker
     def show_date_picker(self): # Open a date picker to select a due date
         """Opens the date picker"""
+        from kivymd.uix.pickers import MDDatePicker # Date picker widget
         date_dialog = MDDatePicker() # Create the date picker
         date_dialog.bind(on_save=self.on_save) # Bind save function to save the selected date
         date_dialog.open() # Open the date picker
 
     #This function will get the date and save it in a good form
     def on_save(self, instance, value, date_range): # Callback function after picking a date
-        date = value.strftime('%A %d %B %Y') # Format the date
-        self.ids.date_text.text = str(date) # Set the selected date in the UI
+        self.due_date = value # Keep the date itself, it is stored as an ISO date
+        self.ids.date_text.text = value.strftime(DISPLAY_DATE_FORMAT) # Set the selected date in the UI
 
 # Class for marking and deleting the list item
-class ListItemWithCheckbox(TwoLineAvatarIconListItem): # List item class with checkbox functionality
+class ListItemWithCheckbox(RecycleDataViewBehavior, TwoLineAvatarIconListItem): # List item class with checkbox functionality, reused by the RecycleView
     def __init__(self, pk=None, **kwargs):
         super().__init__(**kwargs)
         self.pk = pk # Store the primary key (task ID)
+        self.index = None # Position of the row this widget currently shows in the RecycleView data
+
+    def refresh_view_attrs(self, rv, index, data): # Called by the RecycleView when this widget is (re)used for a row
+        self.index = index # Remember which row is being displayed
+        super().refresh_view_attrs(rv, index, data) # Copy pk, text, secondary_text etc. onto the widget
+        self.ids.check.active = data['completed'] # Show the completion status of the row
 
     # Marking the item as complete or incomplete
     def mark(self, check, the_list_item): # Function to mark task as complete or incomplete
         '''Mark the task as complete or incomplete'''
         app = MDApp.get_running_app()  # Get the running app instance
-        if check.active: # If checkbox is checked
-            the_list_item.text = '[s]' + the_list_item.text + '[/s]' # Strike-through the text to indicate completion
-            db.mark_task_as_complete(app.user_id, self.pk)  # Mark the task as complete in the database
-        else: # If checkbox is unchecked
-            the_list_item.text = str(db.mark_task_as_incomplete(app.user_id, self.pk))  # Mark as incomplete in the database
+        app.set_task_completed(self.pk, check.active, self.index) # Update the row and the database
 
     # Deleting the list item
     def delete_item(self, the_list_item): # Function to delete the task
         '''Delete the task'''
         app = MDApp.get_running_app()  # Get the running app instance
-        self.parent.remove_widget(the_list_item) # Remove the item from the UI
-        db.delete_task(app.user_id, self.pk)  # Delete the task from the database
+        app.remove_task(self.pk, self.index) # Remove the row and delete the task from the database
 
 class LeftCheckbox(ILeftBodyTouch, MDCheckbox): # Custom checkbox widget for the task item
     '''Custom left container'''
 
+class ProfilerOverlay(Label): # Debug overlay listing the operations that took the most time, shown when profiling
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        Clock.schedule_interval(self.refresh, 1) # Update the statistics every second
+
+    def refresh(self, dt):
+        if self.opacity: # Skip the work while hidden
+            self.text = '\n'.join(profiler.summary(12)) or 'No statistics yet'
+
 
 #This is the main App class
 class MainApp(MDApp): # Main app class inheriting from MDApp
     task_list_dialog = None # Dialog instance for creating tasks
     user_id = None # Variable to store the logged-in user's ID
+    username = None # Name of the logged-in user
+    page_cursor = None # Where the next page of tasks starts
+    page_request = None # Page of tasks being loaded by the database thread
+    loaded_user = None # User whose tasks are in the list
+    task_version = None # Version of the tasks in the list, see Database.get_task_version
+    completed_start = None # Position of the first completed task in the list
+    saved_tasks = None # The task list rows while search results are shown in their place
+    search_event = None # Scheduled search, waiting for typing to pause
+    search_request = None # Search being run by the database thread
 
     def login_user(self, username, password): # Function to log in a user
-        user = db.authenticate_user(username, password) # Authenticate the user
+        db.submit('authenticate_user', username, password, callback=self.on_login) # Authenticate the user
+
+    def on_login(self, user): # Called with the result of login_user
         if user:
             self.user_id = user[0]  # Store user ID after login
+            self.username = user[1] # Store the user's name
             self.load_tasks()  # Load the user's tasks
         else:
             print("Login failed") # Print failure message if login fails
 
-    def load_tasks(self): # Load all tasks (incomplete and complete) from the database
-        incompleted_tasks, completed_tasks = db.get_tasks(self.user_id) # Get tasks from the database
-        self.root.ids.container.clear_widgets() # Clear the current task list in the UI
-
-        for task in incompleted_tasks: # Add incomplete tasks to the list
-            add_task = ListItemWithCheckbox(pk=task[0], text=str(task[1]), secondary_text=task[2])
-            self.root.ids.container.add_widget(add_task)
-
-        for task in completed_tasks: # Add completed tasks to the list
-            add_task = ListItemWithCheckbox(pk=task[0], text='[s]' + str(task[1]) + "[/s]", secondary_text=task[2])
-            add_task.ids.check.active = True
-            self.root.ids.container.add_widget(add_task)
+    @property
+    def task_list(self): # The RecycleView showing the tasks on the main screen
+        return self.get_screen('main').ids.container
+
+    @property
+    def task_data(self): # The rows of the task list, also while search results are shown instead
+        return self.task_list.data if self.saved_tasks is None else self.saved_tasks
+
+    def shown_lists(self, index=None): # The lists of rows that may show a task, each with a guess of the task's position
+        yield self.task_list.data, index # The rows on screen: the task list or the search results
+        if self.saved_tasks is not None: # The task list hidden behind the search results
+            yield self.saved_tasks, None
+
+    def find_task(self, pk, index=None, data=None): # Find the position of a task in the list data
+        data = self.task_list.data if data is None else data
+        if index is not None and index < len(data) and data[index]['pk'] == pk: # The widget's index is usually still valid
+            return index
+        for i, row in enumerate(data): # Otherwise search for the row by its primary key
+            if row['pk'] == pk:
+                return i
+        return None # The task is not in the list
+
+    def load_tasks(self): # Load the user's tasks, one page at a time
+        if self.loaded_user == self.user_id: # The list already shows this user's tasks, only apply what changed
+            self.refresh_tasks()
+            return
+        user_id = self.loaded_user = self.user_id
+        self.task_version = None # Unknown until the database answers
+        db.submit('get_task_version', user_id, callback=lambda version: self.on_task_version(user_id, version)) # Runs before the pages, so changes made while they load are caught by the next refresh
+        self.end_search() # Search results belong to the previous list
+        self.task_list.data = [] # Start from an empty list
+        self.page_cursor = (0, 0) # (completed, after_id) of the next page to load, None once every task is loaded
+        self.completed_start = None # Position of the first completed task in the list, None while incomplete tasks are still loading
+        self.added_pks = set() # Tasks added in this session before their page was loaded
+        if self.page_request is not None:
+            self.page_request.cancel() # Don't load pages of the previous list
+            self.page_request = None
+        self.load_more_tasks() # Load the first screenful
+
+    def load_more_tasks(self): # Load the next page of tasks: incomplete tasks first, then completed ones
+        if self.page_cursor is None or self.page_request is not None: # Every task is already loaded, or the next page is on its way
+            return
+        completed, after_id = self.page_cursor
+        request = db.submit('get_tasks_page', self.user_id, completed, after_id, PAGE_SIZE,
+                            callback=lambda page: self.on_tasks_page(request, completed, page)) # Get the next page from the database
+        self.page_request = request
+
+    def on_tasks_page(self, request, completed, page): # Called with a page of tasks from the database
+        if request is not self.page_request: # The list was reloaded since this page was requested
+            return
+        self.page_request = None
+        data = self.task_data
+        data.extend(task_row(*task, completed=bool(completed)) for task in page if task[0] not in self.added_pks) # Skip tasks already shown
+        if len(page) == PAGE_SIZE: # There may be more tasks with this status
+            self.page_cursor = (completed, page[-1][0])
+        elif not completed: # No more incomplete tasks, continue with the completed ones
+            self.page_cursor = (1, 0)
+            self.completed_start = len(data)
+            self.load_more_tasks()
+        else: # Every task is loaded
+            self.page_cursor = None
+
+    def on_task_version(self, user_id, version): # Called with the version of the tasks being loaded
+        if user_id == self.loaded_user: # Ignore it if another user logged in meanwhile
+            self.task_version = version
+
+    def refresh_tasks(self): # Get the tasks changed since the list was loaded and apply them
+        if self.task_version is None: # The list is still loading
+            return
+        user_id = self.user_id
+        db.submit('get_tasks_changed_since', user_id, self.task_version,
+                  callback=lambda changes: self.reconcile_tasks(changes) if user_id == self.loaded_user else None)
+
+    def reconcile_tasks(self, changes): # Add, remove or update only the rows that changed, keyed on the task ID
+        changed, deleted, self.task_version = changes
+        data = self.task_data
+        positions = {row['pk']: i for i, row in enumerate(data)} # Where each task is in the list
+        removed = sorted((positions[pk] for pk in deleted if pk in positions), reverse=True)
+        for index in removed: # Remove from the bottom up so the other positions stay valid
+            del data[index]
+            if self.completed_start is not None and index < self.completed_start: # An incomplete task was removed
+                self.completed_start -= 1
+        if removed:
+            positions = {row['pk']: i for i, row in enumerate(data)}
+        added = []
+        for pk, task, due_date, completed in changed:
+            row = task_row(pk, task, due_date, bool(completed))
+            index = positions.get(pk)
+            if index is None:
+                added.append(row)
+            elif data[index] != row: # Only replace rows whose content changed
+                data[index] = row
+        for row in added: # Tasks not in the list, shown where loading them would have put them
+            if row['completed']:
+                if self.page_cursor is None or (self.page_cursor[0] == 1 and row['pk'] <= self.page_cursor[1]): # Its page is already loaded
+                    data.append(row)
+            elif self.completed_start is not None: # Every incomplete task is loaded, show it after them
+                data.insert(self.completed_start, row)
+                self.completed_start += 1
+            elif row['pk'] <= self.page_cursor[1]: # Its page is already loaded
+                data.append(row)
+            # Otherwise a page that isn't loaded yet contains the task
+
+    def on_task_list_scroll(self, scroll_y): # Load more tasks when the list is scrolled close to the bottom
+        if scroll_y < 0.1 and self.user_id is not None and self.saved_tasks is None: # Search results have no more pages
+            self.load_more_tasks()
+
+    def set_task_completed(self, pk, completed, index=None): # Mark a task in the list and database as complete or incomplete
+        for data, hint in self.shown_lists(index):
+            index = self.find_task(pk, hint, data)
+            if index is not None:
+                row = data[index]
+                data[index] = dict(row, completed=completed, text=task_text(row['task'], completed)) # Replace the row so only it gets refreshed
+        if completed:
+            db.submit('mark_task_as_complete', self.user_id, pk) # Mark the task as complete in the database
+        else:
+            db.submit('mark_task_as_incomplete', self.user_id, pk) # Mark the task as incomplete in the database
+
+    def remove_task(self, pk, index=None): # Remove a task from the list and the database
+        for data, hint in self.shown_lists(index):
+            index = self.find_task(pk, hint, data)
+            if index is not None:
+                del data[index] # Remove the row from the list
+                if data is self.task_data and self.completed_start is not None and index < self.completed_start: # An incomplete task was removed
+                    self.completed_start -= 1
+        db.submit('delete_task', self.user_id, pk) # Delete the task from the database
+
+    '''Searching the tasks'''
+    def search_tasks(self, text): # Called on every keystroke in the search field
+        if self.search_event is not None:
+            self.search_event.cancel() # Still typing, forget the previous keystroke
+        self.search_event = Clock.schedule_once(lambda dt: self.run_search(text), SEARCH_DELAY) # Search once typing pauses
+
+    def run_search(self, text): # Search the tasks for the text in the search field
+        self.search_event = None
+        if self.search_request is not None:
+            self.search_request.cancel() # Skip the previous search if it hasn't started yet
+            self.search_request = None
+        if not text.strip(): # The search field was cleared
+            self.end_search()
+            return
+        request = db.submit('search_tasks', self.user_id, text, callback=lambda tasks: self.on_search_results(request, tasks))
+        self.search_request = request
+
+    def on_search_results(self, request, tasks): # Called with the tasks found by a search
+        if request is not self.search_request: # A newer search was started since
+            return
+        self.search_request = None
+        if self.saved_tasks is None: # Keep the task list to show it again when the search ends
+            self.saved_tasks = list(self.task_list.data)
+        self.task_list.data = [task_row(pk, task, due_date, bool(completed)) for pk, task, due_date, completed in tasks]
+
+    def end_search(self): # Stop searching and show the task list again
+        if self.search_event is not None:
+            self.search_event.cancel()
+            self.search_event = None
+        if self.search_request is not None:
+            self.search_request.cancel()
+            self.search_request = None
+        if self.saved_tasks is not None:
+            self.task_list.data = self.saved_tasks
+            self.saved_tasks = None
+
+
+    '''Screens'''
+    screen_classes = {'login': LoginScreen, 'register': RegisterScreen, 'main': MainScreen, 'profile': ProfileScreen} # Class of each screen, by name
+
+    def get_screen(self, name): # The screen called 'name', built the first time it is needed
+        if not self.root.has_screen(name):
+            self.root.add_widget(self.screen_classes[name](name=name))
+        return self.root.get_screen(name)
+
+    def switch_screen(self, name): # Show the screen called 'name', building it first if needed
+        self.get_screen(name)
+        self.root.current = name
 
 
     #This is the build function for setting the theme
@@ -178,16 +432,14 @@ class MainApp(MDApp): # Main app class inheriting from MDApp
         self.theme_cls.primary_palette = "Amber"
 
         sm = ScreenManager()
-        sm.add_widget(LoginScreen(name="login"))
-        sm.add_widget(RegisterScreen(name="register"))
-        sm.add_widget(MainScreen(name="main"))
-        sm.add_widget(ProfileScreen(name="profile"))
+        sm.add_widget(LoginScreen(name="login")) # Only the first screen is built at startup, the others on first use
         return sm
 
         # This is the show task function
 
     def show_task_dialog(self):
         if not self.task_list_dialog:
+            from kivymd.uix.dialog import MDDialog # Class for creating dialogs
             self.task_list_dialog = MDDialog(
                 title="Create Task",
                 type="custom",
@@ -195,17 +447,48 @@ class MainApp(MDApp): # Main app class inheriting from MDApp
             )
         self.task_list_dialog.open()
     def on_start(self):
+        if profiler.enabled:
+            self.start_profiling()
         # Load tasks if user_id is set
         if self.user_id is not None:
-            incompleted_tasks, completed_tasks = db.get_tasks(self.user_id) # Get incomplete and completed tasks for the current user from the database
-            self.root.ids.container.clear_widgets()  # Clear the current task container (UI element) so it can be replaced with fresh data
-            for task in incompleted_tasks: # Loop through each incomplete task and add it to the UI with a checkbox
-                add_task = ListItemWithCheckbox(pk=task[0], text=str(task[1]), secondary_text=task[2])
-                self.root.ids.container.add_widget(add_task) # Add the incomplete task widget to the container
-            for task in completed_tasks: # Loop through each completed task, add it to the UI with a strikethrough on the task text
-                add_task = ListItemWithCheckbox(pk=task[0], text='[s]' + str(task[1]) + "[/s]", secondary_text=task[2])
-                add_task.ids.check.active = True # Mark the checkbox as active (completed)
-                self.root.ids.container.add_widget(add_task) # Add the completed task widget to the container
+            self.load_tasks() # Fill the task list for the current user
+
+    '''Profiling'''
+    def start_profiling(self): # Time the UI handlers and every frame, and show the overlay
+        from kivy.core.window import Window # Imported here, so it isn't imported before the app creates the window
+        for name in PROFILED_HANDLERS: # Only this instance's methods are replaced, kv rules call them through 'app'
+            setattr(self, name, self.profiled_handler(name, getattr(self, name)))
+        Clock.schedule_interval(lambda dt: profiler.record('frame', 'every frame', dt), 0) # Time between frames
+        self.profiler_overlay = ProfilerOverlay()
+        Window.add_widget(self.profiler_overlay) # Drawn over every screen
+        Window.bind(on_keyboard=self.on_profiling_key)
+
+    def profiled_handler(self, name, handler): # Time 'handler' and the frame it runs in
+        def profiled(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return handler(*args, **kwargs)
+            finally:
+                profiler.record('ui', name, time.perf_counter() - start)
+                Clock.schedule_once(lambda dt: profiler.record('frame', name, time.perf_counter() - start), 0) # Runs once the frame is drawn
+        return profiled
+
+    def on_profiling_key(self, window, key, *args): # F12 shows or hides the overlay
+        if key == F12:
+            self.profiler_overlay.opacity = 0 if self.profiler_overlay.opacity else 1
+            return True
+
+    def on_pause(self): # The app is sent to the background (mobile), it may be killed without on_stop
+        try:
+            db.submit('flush').result(timeout=PAUSE_FLUSH_TIMEOUT) # Commit every waiting write before the OS can kill the app
+        except Exception: # Timed out behind a slow job, or the database couldn't be opened, pausing must still succeed
+            pass
+        return True # Allow pausing
+
+    def on_stop(self): # The app is closing
+        db.close() # Finish the waiting database jobs, commit every waiting write and close the database
+        if profiler.enabled:
+            profiler.dump() # Write the statistics to the file named by TODO_PROFILE, or profile.json
 
     # This is a dialog closing function
     def close_dialog(self, *args): # Close the task creation dialog
@@ -216,34 +499,32 @@ class MainApp(MDApp): # Main app class inheriting from MDApp
     # Add a new task and save it in the database
     def add_task(self, task, task_date):
         if task.text: # Ensure that the task text field is not empty
-            created_task = db.create_task(self.user_id, task.text, task_date) # Save the new task into the database for the current user, returning the created task
-
-            # Add the newly created task to the UI (task list in the 'main' screen)
-            self.root.get_screen('main').ids['container'].add_widget(
-                ListItemWithCheckbox(
-                    pk=created_task[0], # Primary key (ID) of the task
-                    text=str(created_task[1]), # Task text
-                    secondary_text=created_task[2] # Task date or any other detail
-                )
-            )
+            db.submit('create_task', self.user_id, task.text, task_date, callback=self.on_task_created) # Save the new task into the database for the current user, returning the created task
             # Clear the task text input field after adding the task
             task.text = ''
             self.close_dialog()  # Close the task creation dialog after adding the task
 
+    def on_task_created(self, created_task): # Add the newly created task to the list on the 'main' screen
+        row = task_row(*created_task) # Primary key, task text and task date
+        if self.completed_start is None: # Incomplete tasks are still loading, show it now and skip it when its page arrives
+            self.added_pks.add(row['pk'])
+            self.task_data.append(row)
+        else: # Show it after the other incomplete tasks
+            self.task_data.insert(self.completed_start, row)
+            self.completed_start += 1
+
     def mark_task_as_complete(self, user_id, taskid): # Mark a task as completed in the database
-        self.cursor.execute("UPDATE tasks SET completed=1 WHERE id=? AND user_id=?", (taskid, user_id)) # Update the task in the database, setting its status to 'completed' (completed=1)
-        self.con.commit() # Commit the transaction to save the changes in the database
+        db.submit('mark_task_as_complete', user_id, taskid) # Update the task in the database, setting its status to 'completed' (completed=1)
 
     def mark_task_as_incomplete(self, taskid): # Mark a task as incomplete in the database
-        db.mark_task_as_incomplete(self.user_id, taskid)  # Use the database method to mark the task as incomplete for the current user
+        db.submit('mark_task_as_incomplete', self.user_id, taskid)  # Use the database method to mark the task as incomplete for the current user
 
     def delete_task(self, user_id, taskid): # Delete a task from the database
-        self.cursor.execute("DELETE FROM tasks WHERE id=? AND user_id=?", (taskid, user_id))  # Delete the task from the database for the current user and task ID
-        self.con.commit() # Commit the transaction to confirm the deletion
+        db.submit('delete_task', user_id, taskid)  # Delete the task from the database for the current user and task ID
 
     def open_profile_screen(self): # Open the profile screen of the application
         # Logic to open the profile screen
-        self.root.current = 'profile_screen' # Switch to the 'profile_screen' screen in the application
+        self.switch_screen('profile') # Switch to the 'profile' screen in the application
 
 if __name__ == '__main__': # If the script is being run directly (not imported as a module)
     app = MainApp() # Create an instance of the MainApp class
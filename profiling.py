@@ -0,0 +1,234 @@
+import json # Dumping the statistics
+import math # Histogram buckets
+import os # Enabling profiling from the environment
+import sqlite3 # Connection and cursor classes that time every statement
+import threading # Statistics are recorded from the UI, database and request threads
+import time # Timing
+from contextlib import contextmanager # For Profiler.timed()
+from functools import lru_cache, wraps # Statement names, wrapped methods
+
+PROFILE_ENV = 'TODO_PROFILE' # Set it (to 1, or to the .json file to dump to) to profile the app, the server or a benchmark
+DEFAULT_DUMP_PATH = 'profile.json' # Where the statistics are dumped when no file is named
+
+
+# Counts of values in logarithmic buckets, 4 per doubling, so percentiles are within 19% whatever the range of the values
+# The count, total, smallest and largest value are exact
+class Histogram:
+    STEPS = 4 # Buckets per doubling
+
+    def __init__(self):
+        self.buckets = {} # Upper bound of the bucket -> number of values in it, 0 has a bucket of its own
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+
+    def add(self, value):
+        bound = 2 ** (math.ceil(math.log2(value) * self.STEPS) / self.STEPS) if value > 0 else 0
+        self.buckets[bound] = self.buckets.get(bound, 0) + 1
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    # The value that 'fraction' of the values are at or below, e.g. percentile(0.99)
+    def percentile(self, fraction):
+        seen = 0
+        for bound in sorted(self.buckets):
+            seen += self.buckets[bound]
+            if seen >= fraction * self.count:
+                return min(bound, self.max) # The bucket's upper bound, but never more than the largest value
+        return self.max
+
+    def as_dict(self, scale=1): # Summary and buckets for the JSON dump, values multiplied by 'scale'
+        if not self.count:
+            return {'count': 0}
+        return {
+            'count': self.count, 'total': self.total * scale, 'mean': self.total / self.count * scale,
+            'min': self.min * scale, 'p50': self.percentile(0.5) * scale, 'p90': self.percentile(0.9) * scale,
+            'p99': self.percentile(0.99) * scale, 'max': self.max * scale,
+            'buckets': [[bound * scale, count] for bound, count in sorted(self.buckets.items())],
+        }
+
+
+# Timings and row counts of one operation, e.g. one SQL statement or one Database method
+class Stat:
+
+    def __init__(self):
+        self.time = Histogram() # Seconds per call
+        self.rows = Histogram() # Rows returned or changed per call, where known
+
+
+# Class for collecting timing statistics from every thread, see the 'profiler' instance below
+# Nothing is wrapped or timed unless profiling is enabled before the Database is created, so a disabled profiler costs nothing
+# Statistics are kept by kind:
+#   'db'     Database methods           'sql'    statements run by execute(), executemany() and executescript()
+#   'fetch'  reading the rows of a      'commit' commits
+#            SELECT, with their count
+#   'ui'     UI handlers                'frame'  time from the start of a UI handler to the next frame, and every frame
+class Profiler:
+
+    def __init__(self, enabled=False, path=DEFAULT_DUMP_PATH):
+        self.enabled = enabled # Whether statistics are recorded
+        self.path = path # Where dump() writes by default
+        self.stats = {} # (kind, name) -> Stat
+        self.lock = threading.Lock() # Guards 'stats'
+
+    # Profiling is enabled when the environment variable PROFILE_ENV is set
+    @classmethod
+    def from_env(cls):
+        value = os.environ.get(PROFILE_ENV, '')
+        return cls(enabled=value not in ('', '0'), path=value if value.endswith('.json') else DEFAULT_DUMP_PATH)
+
+    def enable(self, path=None): # Start recording, call it before creating the Database
+        self.enabled = True
+        self.path = path or self.path
+
+    def disable(self): # Stop recording, wrappers already installed keep running but record nothing
+        self.enabled = False
+
+    '''Recording'''
+    def stat(self, kind, name):
+        key = (kind, name)
+        stat = self.stats.get(key)
+        if stat is None:
+            with self.lock:
+                stat = self.stats.setdefault(key, Stat())
+        return stat
+
+    # Record one call of the operation 'name' that took 'seconds' and returned or changed 'rows' rows (None if unknown)
+    def record(self, kind, name, seconds, rows=None):
+        if not self.enabled:
+            return
+        stat = self.stat(kind, name)
+        with self.lock:
+            stat.time.add(seconds)
+            if rows is not None:
+                stat.rows.add(rows)
+
+    @contextmanager
+    def timed(self, kind, name): # Record the time taken by a 'with' block
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(kind, name, time.perf_counter() - start)
+
+    # Replace the methods of 'obj' by timed ones, only on that instance: 'names', or every public method not in 'exclude'
+    # A method returning a list also records its length as the row count
+    def instrument(self, obj, kind, names=None, exclude=()):
+        if names is None:
+            names = [name for name, value in vars(type(obj)).items()
+                     if callable(value) and not name.startswith('_') and name not in exclude]
+        for name in names:
+            setattr(obj, name, self.timed_function(kind, name, getattr(obj, name)))
+
+    def timed_function(self, kind, name, function):
+        @wraps(function)
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            result = function(*args, **kwargs)
+            self.record(kind, name, time.perf_counter() - start, len(result) if isinstance(result, list) else None)
+            return result
+        return timed
+
+    '''Reporting'''
+    # The statistics as a dict, {kind: {name: {'time_ms': {...}, 'rows': {...}}}}, times in milliseconds
+    def snapshot(self):
+        with self.lock:
+            result = {}
+            for (kind, name), stat in self.stats.items():
+                entry = {'time_ms': stat.time.as_dict(1000)}
+                if stat.rows.count:
+                    entry['rows'] = stat.rows.as_dict()
+                result.setdefault(kind, {})[name] = entry
+            return result
+
+    def dump(self, path=None): # Write the statistics to a JSON file, by default the one named when profiling was enabled
+        with open(path or self.path, 'w') as file:
+            json.dump(self.snapshot(), file, indent=1)
+
+    def summary(self, limit=10): # One line for each of the 'limit' operations that took the most time in total
+        with self.lock:
+            stats = sorted(self.stats.items(), key=lambda item: item[1].time.total, reverse=True)[:limit]
+            return ['%-6s %6d x  p50 %7.2f  p99 %7.2f  total %8.1f ms  %s'
+                    % (kind, stat.time.count, stat.time.percentile(0.5) * 1000, stat.time.percentile(0.99) * 1000,
+                       stat.time.total * 1000, name[:60]) for (kind, name), stat in stats]
+
+    def reset(self):
+        with self.lock:
+            self.stats = {}
+
+
+# A short, one-line name for an SQL statement, its parameters are placeholders so there are only a few of them
+@lru_cache(maxsize=1024)
+def statement_name(sql):
+    name = ' '.join(sql.split())
+    return name if len(name) <= 200 else name[:197] + '...'
+
+
+# Cursor that times every statement and counts the rows it reads or changes, created by ProfiledConnection
+class ProfiledCursor(sqlite3.Cursor):
+
+    def execute(self, sql, parameters=()):
+        start = time.perf_counter()
+        super().execute(sql, parameters)
+        profiler.record('sql', statement_name(sql), time.perf_counter() - start, self.rowcount if self.rowcount >= 0 else None)
+        self.statement = statement_name(sql) # Rows fetched later are counted for this statement
+        return self
+
+    def executemany(self, sql, parameters):
+        start = time.perf_counter()
+        super().executemany(sql, parameters)
+        profiler.record('sql', statement_name(sql), time.perf_counter() - start, self.rowcount if self.rowcount >= 0 else None)
+        return self
+
+    def executescript(self, script):
+        start = time.perf_counter()
+        super().executescript(script)
+        profiler.record('sql', statement_name(script), time.perf_counter() - start)
+        return self
+
+    # SQLite finds the rows of a SELECT while they are fetched, so fetching is timed too
+    def fetchone(self):
+        start = time.perf_counter()
+        row = super().fetchone()
+        profiler.record('fetch', getattr(self, 'statement', '?'), time.perf_counter() - start, 0 if row is None else 1)
+        return row
+
+    def fetchmany(self, size=None):
+        start = time.perf_counter()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        profiler.record('fetch', getattr(self, 'statement', '?'), time.perf_counter() - start, len(rows))
+        return rows
+
+    def fetchall(self):
+        start = time.perf_counter()
+        rows = super().fetchall()
+        profiler.record('fetch', getattr(self, 'statement', '?'), time.perf_counter() - start, len(rows))
+        return rows
+
+
+# Connection whose cursors time every statement, and which times its commits
+# Pass it as sqlite3.connect(..., factory=ProfiledConnection)
+class ProfiledConnection(sqlite3.Connection):
+
+    def cursor(self, factory=ProfiledCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, parameters):
+        return self.cursor().executemany(sql, parameters)
+
+    def executescript(self, script):
+        return self.cursor().executescript(script)
+
+    def commit(self):
+        start = time.perf_counter()
+        super().commit()
+        profiler.record('commit', 'commit', time.perf_counter() - start)
+
+
+profiler = Profiler.from_env() # The profiler used by the Database, the app and the server
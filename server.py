@@ -0,0 +1,276 @@
+'''Headless HTTP/JSON server for the to-do database, so many users can use it at once without the app
+
+Run from the project folder:
+    python server.py                          # http://127.0.0.1:8000, todo.db
+    python server.py --port 9000 --pool-size 8
+
+Endpoints (JSON in, JSON out; every endpoint but /register and /login needs an "Authorization: Bearer <token>" header):
+    POST   /register                 {"username", "password"}          -> 201 {"registered": true}
+    POST   /login                    {"username", "password"}          -> {"token", "user_id", "username"}
+    GET    /tasks                                                      -> {"incomplete": [...], "completed": [...]}
+    GET    /tasks?completed=0&after_id=0&limit=50                      -> {"tasks": [...]}, one page, limit is 1 to 500
+    GET    /tasks/search?q=milk&limit=50                               -> {"tasks": [...]}, limit is 1 to 500
+    POST   /tasks                    {"task", "due_date"}              -> 201 {"id", "task", "due_date"}
+    POST   /tasks/<id>/complete                                        -> {"id", "completed": true}
+    POST   /tasks/<id>/incomplete                                      -> {"id", "completed": false}
+    DELETE /tasks/<id>                                                 -> {"id", "deleted": true}
+    GET    /debug/profile                                              -> timing statistics, with --profile only
+'''
+import argparse # Command line options
+import json # Request and response bodies
+import re # Task URLs
+import secrets # Login tokens
+import signal # Shutting down cleanly when terminated
+import sys # Exiting on SIGTERM
+import threading # Guards the token table
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer # One thread per connection
+from urllib.parse import parse_qs, urlsplit # Query strings
+
+from auth import DEFAULT_ITERATIONS, PasswordHasher # Password hashing work factor
+from database import Database # Custom database class for app data
+from profiling import profiler # Timing statistics of the database, with --profile
+
+TASK_URL = re.compile(r'/tasks/(\d+)(?:/(complete|incomplete))?$') # A task, or a change of its status
+MAX_BODY = 1 << 20 # Largest request body accepted, in bytes
+MAX_LIMIT = 500 # Largest page or search result a request can ask for
+
+
+# An error sent back to the client as {"error": message} with the given HTTP status
+class HTTPError(Exception):
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+# Login tokens of the signed in users, shared by the request threads
+class Sessions:
+
+    def __init__(self):
+        self.users = {} # Token -> (user ID, username)
+        self.lock = threading.Lock()
+
+    def create(self, user):
+        token = secrets.token_urlsafe(32)
+        with self.lock:
+            self.users[token] = user
+        return token
+
+    def get(self, token):
+        with self.lock:
+            return self.users.get(token)
+
+
+# Handles one HTTP connection, keep-alive connections send several requests through the same handler
+class TodoRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1' # Keep connections open between requests
+    disable_nagle_algorithm = True # Send the headers and the body without waiting for the client's ACK in between
+    server_version = 'TodoServer/1.0'
+
+    def do_GET(self):
+        self.dispatch('GET')
+
+    def do_POST(self):
+        self.dispatch('POST')
+
+    def do_DELETE(self):
+        self.dispatch('DELETE')
+
+    '''Routing'''
+    # Run the endpoint for the request and send its result, every endpoint uses the database inside one session
+    def dispatch(self, method):
+        url = urlsplit(self.path)
+        self.query = parse_qs(url.query)
+        try:
+            body = self.read_body()
+            with self.server.db.session(): # A pooled connection for this request, its writes are committed at the end
+                status, result = self.route(method, url.path, body)
+        except HTTPError as error:
+            status, result = error.status, {'error': str(error)}
+        except Exception as error: # Report the error instead of dropping the connection
+            self.log_error('%s %s failed: %r', method, self.path, error)
+            status, result = 500, {'error': 'Internal server error'}
+        self.send_json(status, result)
+
+    def route(self, method, path, body):
+        if path == '/register' and method == 'POST':
+            return self.register(body)
+        if path == '/login' and method == 'POST':
+            return self.login(body)
+        if path == '/debug/profile' and method == 'GET' and profiler.enabled:
+            return 200, profiler.snapshot()
+        user_id = self.authenticate()
+        if path == '/tasks' and method == 'GET':
+            return self.get_tasks(user_id)
+        if path == '/tasks' and method == 'POST':
+            return self.create_task(user_id, body)
+        if path == '/tasks/search' and method == 'GET':
+            return 200, {'tasks': [task_json(row) for row in self.server.db.search_tasks(user_id, self.param('q', ''), self.limit_param())]}
+        match = TASK_URL.match(path)
+        if match and method == 'POST' and match.group(2):
+            return self.set_completed(user_id, int(match.group(1)), match.group(2) == 'complete')
+        if match and method == 'DELETE' and not match.group(2):
+            return self.delete_task(user_id, int(match.group(1)))
+        raise HTTPError(404, 'No endpoint %s %s' % (method, path))
+
+    '''Endpoints'''
+    def register(self, body):
+        if not self.server.db.register_user(require(body, 'username'), require(body, 'password')):
+            raise HTTPError(409, 'Username already exists')
+        return 201, {'registered': True}
+
+    def login(self, body):
+        user = self.server.db.authenticate_user(require(body, 'username'), require(body, 'password'))
+        if user is None:
+            raise HTTPError(401, 'Invalid username or password')
+        return 200, {'token': self.server.sessions.create(user), 'user_id': user[0], 'username': user[1]}
+
+    def get_tasks(self, user_id):
+        db = self.server.db
+        if 'completed' in self.query: # One page of incomplete or completed tasks
+            page = db.get_tasks_page(user_id, self.int_param('completed', 0), self.int_param('after_id', 0), self.limit_param())
+            return 200, {'tasks': [task_json(row) for row in page]}
+        incomplete, completed = db.get_tasks(user_id)
+        return 200, {'incomplete': [task_json(row) for row in incomplete], 'completed': [task_json(row) for row in completed]}
+
+    def create_task(self, user_id, body):
+        due_date = body.get('due_date')
+        if due_date is not None and not isinstance(due_date, str):
+            raise HTTPError(400, 'due_date must be text or null')
+        try:
+            task_id, task, due_date = self.server.db.create_task(user_id, require(body, 'task'), due_date)
+        except ValueError as error: # An ISO date that doesn't exist, e.g. '2024-02-31'
+            raise HTTPError(400, 'Invalid due_date: %s' % error)
+        return 201, {'id': task_id, 'task': task, 'due_date': due_date}
+
+    def set_completed(self, user_id, task_id, completed):
+        db = self.server.db
+        changed = db.mark_task_as_complete(user_id, task_id) if completed else db.mark_task_as_incomplete(user_id, task_id)
+        if not changed:
+            raise HTTPError(404, 'No task %d' % task_id)
+        return 200, {'id': task_id, 'completed': completed}
+
+    def delete_task(self, user_id, task_id):
+        if not self.server.db.delete_task(user_id, task_id):
+            raise HTTPError(404, 'No task %d' % task_id)
+        return 200, {'id': task_id, 'deleted': True}
+
+    '''Reading requests'''
+    # The user ID of the request's bearer token
+    def authenticate(self):
+        scheme, _, token = self.headers.get('Authorization', '').partition(' ')
+        user = self.server.sessions.get(token) if scheme.lower() == 'bearer' else None
+        if user is None:
+            raise HTTPError(401, 'Login required')
+        return user[0]
+
+    def read_body(self):
+        try:
+            length = int(self.headers.get('Content-Length') or 0)
+        except ValueError:
+            length = -1
+        if length < 0:
+            self.close_connection = True # Where the body ends is unknown, so the connection can't carry another request
+            raise HTTPError(400, 'Invalid Content-Length')
+        if length > MAX_BODY:
+            self.close_connection = True # The body is left unread, so the connection can't carry another request
+            raise HTTPError(413, 'Request body too large')
+        if not length:
+            return {}
+        try:
+            body = json.loads(self.rfile.read(length))
+        except ValueError:
+            raise HTTPError(400, 'Request body is not valid JSON')
+        if not isinstance(body, dict):
+            raise HTTPError(400, 'Request body must be a JSON object')
+        return body
+
+    def param(self, name, default):
+        return self.query.get(name, [default])[0]
+
+    def int_param(self, name, default):
+        try:
+            return int(self.param(name, default))
+        except ValueError:
+            raise HTTPError(400, '%s must be a whole number' % name)
+
+    # The 'limit' of a page or search, SQLite would read every row for a negative one
+    def limit_param(self):
+        limit = self.int_param('limit', 50)
+        if not 1 <= limit <= MAX_LIMIT:
+            raise HTTPError(400, 'limit must be between 1 and %d' % MAX_LIMIT)
+        return limit
+
+    '''Sending responses'''
+    def send_json(self, status, result):
+        data = json.dumps(result).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        if not self.server.quiet:
+            super().log_message(format, *args)
+
+
+# The HTTP server, holding the database and the login tokens shared by the request threads
+class TodoServer(ThreadingHTTPServer):
+    daemon_threads = True # Don't wait for idle keep-alive connections on shutdown
+    request_queue_size = 128 # Connections waiting to be accepted, the default of 5 resets clients when many connect at once
+
+    def __init__(self, address, db, quiet=False):
+        super().__init__(address, TodoRequestHandler)
+        self.db = db # Database shared by the request threads through its connection pool
+        self.sessions = Sessions() # Signed in users
+        self.quiet = quiet # Don't log every request
+
+
+# A string field of a JSON request body, which must be present
+def require(body, name):
+    value = body.get(name)
+    if not isinstance(value, str) or not value:
+        raise HTTPError(400, '%s is required' % name)
+    return value
+
+
+# A task row as JSON
+def task_json(row):
+    task = {'id': row[0], 'task': row[1], 'due_date': row[2]}
+    if len(row) > 3:
+        task['completed'] = bool(row[3])
+    return task
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--db', default='todo.db') # Database file
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--pool-size', type=int, default=8) # Largest number of requests using the database at once
+    parser.add_argument('--iterations', type=int, default=DEFAULT_ITERATIONS) # PBKDF2 work factor of new passwords
+    parser.add_argument('--quiet', action='store_true') # Don't log every request
+    parser.add_argument('--profile', metavar='FILE') # Record timing statistics, and dump them to FILE on shutdown
+    args = parser.parse_args()
+    if args.profile:
+        profiler.enable(args.profile) # Before the database is opened, so its connections are timed
+
+    # WAL lets the pooled connections read while one of them writes, sessions commit at the end of every request
+    db = Database(args.db, write_behind=True, hasher=PasswordHasher(iterations=args.iterations), pool_size=args.pool_size)
+    server = TodoServer((args.host, args.port), db, quiet=args.quiet)
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0)) # 'kill' shuts down like Ctrl+C, committing and dumping
+    print('Serving %s on http://%s:%d' % (args.db, args.host, server.server_port), flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        db.close_db_connection()
+        if profiler.enabled:
+            profiler.dump()
+
+
+if __name__ == '__main__':
+    main()